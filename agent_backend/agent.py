@@ -9,16 +9,16 @@ This module provides the main entry points for the 3-agent architecture:
 Each agent is independent and can be called directly via API endpoints.
 """
 
-from typing import Dict, Any
+from typing import Dict, Any, AsyncIterator, Optional
 
 # Import individual agents
 from agents.vision_agent import vision_agent_analyze
-from agents.search_agent import search_agent_query
+from agents.search_agent import search_agent_query, search_agent_stream
 from agents.solution_agent import solution_agent_generate
 
 
 async def run_vision_agent(
-    image_base64: str,
+    image_bytes: bytes,
     mime_type: str = "image/jpeg",
     filename: str = "image.jpg"
 ) -> Dict[str, Any]:
@@ -26,14 +26,14 @@ async def run_vision_agent(
     Run the Vision Agent to analyze an image/video for accessibility barriers.
     
     Args:
-        image_base64: Base64-encoded image data
+        image_bytes: Raw image data
         mime_type: MIME type of the file
         filename: Original filename
         
     Returns:
         Analysis results with category, severity, description, etc.
     """
-    return await vision_agent_analyze(image_base64, mime_type, filename)
+    return await vision_agent_analyze(image_bytes, mime_type, filename)
 
 
 async def run_search_agent(query: str) -> Dict[str, Any]:
@@ -49,11 +49,25 @@ async def run_search_agent(query: str) -> Dict[str, Any]:
     return await search_agent_query(query)
 
 
+def run_search_agent_stream(query: str) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Run the Search Agent, streaming results as they become available.
+    
+    Args:
+        query: Natural language search query
+        
+    Returns:
+        Async iterator yielding the unfiltered candidates first ("partial": True),
+        then the final result ("partial": False)
+    """
+    return search_agent_stream(query)
+
+
 async def run_solution_agent(
     description: str,
     category: str,
     severity: str,
-    image_base64: str = None,
+    image_bytes: Optional[bytes] = None,
     mime_type: str = "image/jpeg"
 ) -> Dict[str, Any]:
     """
@@ -63,7 +77,7 @@ async def run_solution_agent(
         description: Description of the barrier
         category: Category of the barrier
         severity: Severity level
-        image_base64: Optional image for context
+        image_bytes: Optional raw image for context
         mime_type: MIME type of the image
         
     Returns:
@@ -73,15 +87,11 @@ async def run_solution_agent(
         description=description,
         category=category,
         severity=severity,
-        image_base64=image_base64,
+        image_bytes=image_bytes,
         mime_type=mime_type
     )
 
 
-# Legacy function for backward compatibility with existing /agent/search endpoint
-async def run_search(query: str) -> Dict[str, Any]:
-    """
-    Legacy wrapper for backward compatibility.
-    Maps to the new Search Agent.
-    """
-    return await run_search_agent(query)
+# Legacy name for backward compatibility with the existing /agent/search endpoint.
+# An alias rather than a wrapper, so there is no extra coroutine hop per search.
+run_search = run_search_agent
@@ -0,0 +1,149 @@
+"""
+Micro-batching for Gemini calls.
+
+Under load, the vision and solution agents make one request per report and run
+into Gemini's requests-per-minute limit long before latency matters. Requests
+submitted within a short window are sent together as one prompt ("--- Request 1
+---", "--- Request 2 ---", ...) that asks for a JSON array of answers, each tagged
+with its request number, and the answers are routed back to the callers by
+that number.
+"""
+
+import os
+import asyncio
+import orjson
+import logging
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain_core.messages import SystemMessage, HumanMessage
+
+logger = logging.getLogger(__name__)
+
+# How long the first request waits for others to join, and the most sent in one call
+# (LLM_BATCH_SIZE=1 sends every request on its own)
+BATCH_WINDOW = float(os.getenv('LLM_BATCH_WINDOW_MS', '20')) / 1000
+BATCH_MAX_SIZE = int(os.getenv('LLM_BATCH_SIZE', '8'))
+
+BATCH_INSTRUCTIONS = """You will receive {count} independent requests, each starting with "--- Request N ---".
+Answer each one exactly as instructed above, treating it on its own.
+Respond with ONLY a JSON array of {count} elements (no markdown), one per request, each of the form
+{{"request": N, "answer": <the JSON answer to Request N>}}."""
+
+
+def strip_json_fences(text: str) -> str:
+    """Remove the markdown code fences Gemini sometimes wraps JSON in."""
+    return text.replace('```json', '').replace('```', '').strip()
+
+
+def match_batch_answers(elements: Any, count: int) -> Optional[List[Any]]:
+    """
+    Order the tagged answers of a batched response by request number.
+    Returns None unless every request 1..count is answered exactly once, so an
+    answer can never reach the wrong caller.
+    """
+    if not isinstance(elements, list) or len(elements) != count:
+        return None
+
+    answers: Dict[int, Any] = {}
+    for element in elements:
+        if not isinstance(element, dict) or 'answer' not in element:
+            return None
+        number = element.get('request')
+        if type(number) is not int or not 1 <= number <= count or number in answers:
+            return None
+        answers[number] = element['answer']
+
+    return [answers[number] for number in range(1, count + 1)]
+
+
+class BatchedGeminiClient:
+    """
+    Collects concurrent requests that share a system prompt and sends them to
+    Gemini in batches. submit() returns the model's text answer for one request.
+    """
+
+    def __init__(
+        self,
+        get_llm: Callable[[], ChatGoogleGenerativeAI],
+        system_message: SystemMessage,
+        max_batch: int = BATCH_MAX_SIZE,
+        window: float = BATCH_WINDOW,
+    ):
+        self.get_llm = get_llm
+        self.system_message = system_message
+        self.max_batch = max_batch
+        self.window = window
+        self._queue: Optional["asyncio.Queue[Tuple[List[Dict[str, Any]], asyncio.Future]]"] = None
+        self._worker: Optional[asyncio.Task] = None
+        # The event loop only keeps weak references to tasks; hold in-flight dispatches here
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def submit(self, content: List[Dict[str, Any]]) -> str:
+        """
+        Queue one request (the content parts of its human message) and wait for
+        its answer.
+        """
+        if self.max_batch <= 1:
+            return await self._send_one(content)
+
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((content, future))
+        return await future
+
+    async def _run(self) -> None:
+        """Gather requests for one window, then dispatch them without waiting."""
+        while True:
+            batch = [await self._queue.get()]
+            await asyncio.sleep(self.window)
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            task = asyncio.create_task(self._dispatch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self, batch: List[Tuple[List[Dict[str, Any]], asyncio.Future]]) -> None:
+        contents = [content for content, _ in batch]
+        try:
+            if len(batch) == 1:
+                answers = [await self._send_one(contents[0])]
+            else:
+                answers = await self._send_batch(contents)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), answer in zip(batch, answers):
+            if not future.done():
+                future.set_result(answer)
+
+    async def _send_one(self, content: List[Dict[str, Any]]) -> str:
+        response = await self.get_llm().ainvoke([self.system_message, HumanMessage(content=content)])
+        return response.content
+
+    async def _send_batch(self, contents: List[List[Dict[str, Any]]]) -> List[str]:
+        parts: List[Dict[str, Any]] = [
+            {"type": "text", "text": BATCH_INSTRUCTIONS.format(count=len(contents))}
+        ]
+        for i, content in enumerate(contents, 1):
+            parts.append({"type": "text", "text": f"--- Request {i} ---"})
+            parts.extend(content)
+
+        response = await self.get_llm().ainvoke([self.system_message, HumanMessage(content=parts)])
+        try:
+            answers = match_batch_answers(orjson.loads(strip_json_fences(response.content)), len(contents))
+        except ValueError:
+            answers = None
+
+        if answers is None:
+            # The model didn't keep the answers apart; fall back to one call each
+            logger.warning("Batched response unusable for %d requests, sending individually", len(contents))
+            return list(await asyncio.gather(*(self._send_one(content) for content in contents)))
+
+        return [orjson.dumps(answer).decode() for answer in answers]
@@ -0,0 +1,109 @@
+"""
+Fast Intent - Extracts search filters with keyword rules instead of an LLM.
+
+Most queries either describe a barrier in plain words ("steep ramp near campus")
+or name their filters outright ("high severity potholes"). Both can be turned
+into a search plan in microseconds; only ambiguous queries need Gemini.
+"""
+
+import re
+from typing import Dict, Any, Optional
+
+# Severity only counts next to "severity"/"priority"; a bare "high" would
+# misfire on phrases like "high curb"
+_SEVERITY_RE = re.compile(
+    r'\b(low|medium|high)[\s-]*(?:severity|priority)\b'
+    r'|\b(?:severity|priority)\s*(?:of|:|=)?\s*(low|medium|high)\b',
+    re.I,
+)
+
+_STATUS_RE = re.compile(r'\b(unresolved|resolved|acknowledged|in[\s_-]progress)\b', re.I)
+_STATUS_MAP = {
+    'unresolved': 'open',
+    'resolved': 'resolved',
+    'acknowledged': 'acknowledged',
+}
+
+# Phrases that unambiguously name a report category, keyed on the category IDs
+# stored with reports (frontend/src/lib/types.ts). The category becomes a hard
+# filter, so only multi-word phrases are listed - a lone incidental word like
+# "dark" or "steep" is left to the semantic search.
+_CATEGORY_KEYWORDS = {
+    'blocked_path': ('blocked path', 'blocked sidewalk', 'path blocked', 'sidewalk blocked'),
+    'broken_sidewalk': ('broken sidewalk', 'cracked sidewalk', 'sidewalk crack', 'cracked pavement'),
+    'construction_barrier': ('construction barrier', 'construction fence'),
+    'drainage_issue': ('drainage issue', 'drainage problem', 'flooded sidewalk', 'standing water'),
+    'missing_ramp': ('missing ramp', 'missing curb ramp'),
+    'missing_signage': ('missing signage', 'missing sign'),
+    'missing_tactile': ('missing tactile', 'tactile paving'),
+    'narrow_passage': ('narrow passage', 'narrow sidewalk', 'narrow path'),
+    'no_crossing_signal': ('no crossing signal', 'missing crossing signal'),
+    'no_curb_cut': ('no curb cut', 'missing curb cut'),
+    'no_ramp': ('no ramp', 'without a ramp', 'stairs only'),
+    'obstacle_on_path': ('obstacle on path', 'obstacle on the path'),
+    'overgrown_vegetation': ('overgrown vegetation', 'overgrown bush', 'overgrown hedge', 'overgrown tree'),
+    'parking_violation': ('parking violation', 'illegally parked'),
+    'poor_lighting': ('poor lighting', 'no lighting', 'broken streetlight', 'broken street light'),
+    'pothole': ('pothole',),
+    'slippery_surface': ('slippery surface', 'icy sidewalk', 'icy path'),
+    'steep_grade': ('steep grade', 'steep slope', 'steep incline'),
+    'uneven_surface': ('uneven surface', 'uneven sidewalk', 'uneven pavement', 'tripping hazard'),
+}
+
+
+def _phrase_pattern(phrase: str) -> str:
+    # Words may be separated by spaces, hyphens or underscores; allow a plural
+    return re.escape(phrase).replace(r'\ ', r'[\s_-]+')
+
+
+_CATEGORY_RES = [
+    (category, re.compile(r'\b(?:' + '|'.join(_phrase_pattern(k) for k in keywords) + r')s?\b', re.I))
+    for category, keywords in _CATEGORY_KEYWORDS.items()
+]
+
+# Negations and boolean connectives change what the filters mean - leave those to the LLM
+_AMBIGUOUS_RE = re.compile(r'\b(not|except|excluding|without|or|but|either|neither|nor)\b', re.I)
+
+
+def classify_intent(query: str) -> Optional[Dict[str, Any]]:
+    """
+    Build a search plan from keywords alone.
+
+    Returns a plan in the same shape the LLM produces
+    (semantic_query, filters, reasoning), or None if the query
+    is ambiguous and should go to the LLM.
+    """
+    filters: Dict[str, str] = {}
+
+    severity = _SEVERITY_RE.search(query)
+    if severity:
+        filters['severity'] = (severity.group(1) or severity.group(2)).lower()
+
+    status = _STATUS_RE.search(query)
+    if status:
+        key = status.group(1).lower()
+        filters['status'] = _STATUS_MAP.get(key, 'in_progress')
+
+    categories = [category for category, pattern in _CATEGORY_RES if pattern.search(query)]
+    if len(categories) == 1:
+        filters['category'] = categories[0]
+    elif len(categories) > 1:
+        # Several categories mentioned - can't pick one filter
+        return None
+
+    # "without a ramp" or "no curb cut" is a category phrase, not a negation
+    remainder = query
+    for _, pattern in _CATEGORY_RES:
+        remainder = pattern.sub(' ', remainder)
+    if _AMBIGUOUS_RE.search(remainder):
+        return None
+
+    if not filters and len(query.split()) <= 3:
+        # Too short to be sure there is nothing to extract
+        return None
+
+    return {
+        "semantic_query": query,
+        "filters": filters,
+        "reasoning": f"Keyword match: {filters}" if filters else "Plain semantic search, no filters mentioned.",
+    }
@@ -1,29 +1,15 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.messages import SystemMessage, HumanMessage
+from langchain_core.prompts import ChatPromptTemplate
 from state import AgentState
-import os
-import json
+from agents.fast_intent import classify_intent
+from agents.llm import get_llm
+from cache import get_cached_intent, set_cached_intent
+import logging
+import orjson
 
-def get_llm():
-    api_key = os.getenv('GEMINI_API_KEY')
-    return ChatGoogleGenerativeAI(
-        model="gemini-2.0-flash",
-        google_api_key=api_key,
-        temperature=0,
-    )
+logger = logging.getLogger(__name__)
 
-def intent_analyst_node(state: AgentState):
-    """
-    Agent 1: Intent Analyst
-    Analyzes the user's latest message to understand what they are looking for.
-    Produces a 'search_plan' which is a structured description of the search.
-    """
-    messages = state['messages']
-    last_message = messages[-1].content
-    
-    llm = get_llm()
-    
-    system_prompt = """You are an expert Accessibility Search Analyst.
+
+SYSTEM_PROMPT = """You are an expert Accessibility Search Analyst.
 Your goal is to understand the user's intent and create a clear, actionable SEARCH PLAN for the executor.
 
 You DO NOT execute the search. You INITIALIZE the search by defining:
@@ -38,36 +24,74 @@ Output your plan as a JSON object with these keys:
 
 IMPORTANT: Your response must be ONLY valid JSON, nothing else.
 """
+
+# The prompt is parsed once; the user query is passed in as a variable,
+# so braces in it are never treated as template syntax
+PROMPT = ChatPromptTemplate.from_messages([
+    ("system", SYSTEM_PROMPT),
+    ("human", "{input}"),
+])
+
+_chain = None
+
+
+def get_chain():
+    """Get the prompt | LLM chain (built once on first use)."""
+    global _chain
+    if _chain is None:
+        _chain = PROMPT | get_llm()
+    return _chain
+
+
+async def intent_analyst_node(state: AgentState):
+    """
+    Agent 1: Intent Analyst
+    Analyzes the user's latest message to understand what they are looking for.
+    Produces a 'search_plan_dict', a structured description of the search.
+    """
+    messages = state['messages']
+    last_message = messages[-1].content
+    
+    # Clear-cut queries don't need the LLM; fall back to cached LLM plans next
+    plan = classify_intent(last_message)
+    if plan is not None:
+        logger.debug("Fast intent match, skipping LLM")
+    else:
+        plan = await get_cached_intent("intent", last_message)
+        if plan is not None:
+            logger.debug("Cache hit, skipping LLM")
+    
+    if plan is not None:
+        return {
+            "search_plan_dict": plan,
+            "trace": state.get("trace", []) + ["intent_analyst"]
+        }
     
     try:
-        # Use direct invocation instead of ChatPromptTemplate to avoid escaping issues
-        response = llm.invoke([
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=last_message)
-        ])
+        response = await get_chain().ainvoke({"input": last_message})
         
         # Check if response has content
         if not response or not response.content:
-            print("[INTENT_ANALYST] WARNING: Empty response from LLM, using fallback")
+            logger.warning("Empty response from LLM, using fallback")
             raise ValueError("Empty response from LLM")
         
-        print(f"[INTENT_ANALYST] LLM Response: {response.content[:200]}")
+        logger.debug("LLM response: %.200s", response.content)
         
         # Try to parse JSON, fallback to raw text if needed
         content = response.content.replace('```json', '').replace('```', '').strip()
-        plan = json.loads(content)
-        search_plan = json.dumps(plan)
-        print(f"[INTENT_ANALYST] Parsed plan: {search_plan}")
+        plan = orjson.loads(content)
+        await set_cached_intent("intent", last_message, plan)
+        logger.debug("Parsed plan: %s", plan)
     except Exception as e:
         # Fallback for any error
-        print(f"[INTENT_ANALYST] Error parsing response: {e}")
-        search_plan = json.dumps({
+        logger.warning("Error parsing response: %s", e)
+        plan = {
             "semantic_query": last_message,
             "filters": {},
             "reasoning": "Could not parse structured plan, passing raw query."
-        })
+        }
     
     return {
-        "search_plan": search_plan,
+        "search_plan_dict": plan,
         "trace": state.get("trace", []) + ["intent_analyst"]
     }
@@ -0,0 +1,27 @@
+"""
+Shared Gemini chat clients.
+
+Every agent talks to the same model; reusing one client per temperature keeps
+its connections open across requests and agents.
+"""
+
+import os
+from typing import Dict
+
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+LLM_MODEL = "gemini-2.0-flash"
+
+_llms: Dict[float, ChatGoogleGenerativeAI] = {}
+
+
+def get_llm(temperature: float = 0) -> ChatGoogleGenerativeAI:
+    """Get the Gemini LLM instance for a temperature (one shared client each)."""
+    llm = _llms.get(temperature)
+    if llm is None:
+        llm = _llms[temperature] = ChatGoogleGenerativeAI(
+            model=LLM_MODEL,
+            google_api_key=os.getenv('GEMINI_API_KEY'),
+            temperature=temperature,
+        )
+    return llm
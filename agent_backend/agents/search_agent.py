@@ -10,51 +10,39 @@ Replaces the previous 3-agent system (Intent Analyst + Search Specialist + Super
 """
 
 import os
-import json
-from typing import Dict, Any, List
-from langchain_google_genai import ChatGoogleGenerativeAI
+import logging
+import orjson
+import asyncio
+import numpy as np
+from typing import Dict, Any, List, Set, Tuple, AsyncIterator, Optional
 from langchain_core.messages import SystemMessage, HumanMessage
 
+from agents.fast_intent import classify_intent
+from agents.llm import get_llm
+from cache import get_cached_intent, set_cached_intent
 from db import get_all_reports
-from embeddings import search_similar, build_index
-from tools import filter_by_severity, filter_by_category
+from embeddings import (
+    build_index,
+    embed_query,
+    search_vectors,
+    search_bm25,
+    reciprocal_rank_fusion,
+    get_data_version,
+    get_index_size,
+)
 
+logger = logging.getLogger(__name__)
 
-def get_llm():
-    """Get the Gemini LLM instance."""
-    api_key = os.getenv('GEMINI_API_KEY')
-    return ChatGoogleGenerativeAI(
-        model="gemini-2.0-flash",
-        google_api_key=api_key,
-        temperature=0,
-    )
+# Number of results returned by a search
+TOP_K = 15
 
+# Skip waiting for LLM intent analysis when every semantic match scores above this
+# (or there are only a few candidates); filters would barely change such results
+CONFIDENT_SCORE = float(os.getenv('SEARCH_CONFIDENT_SCORE', '0.75'))
+CONFIDENT_MAX_CANDIDATES = 3
 
-async def search_agent_query(query: str) -> Dict[str, Any]:
-    """
-    Search for accessibility reports using natural language.
-    
-    This agent:
-    1. Analyzes the query to understand intent and extract filters
-    2. Performs semantic vector search
-    3. Applies any extracted filters
-    4. Returns matching reports with a summary
-    
-    Args:
-        query: Natural language search query (e.g., "missing ramps near campus")
-        
-    Returns:
-        Dictionary with:
-        - matchingIds: List of matching report IDs
-        - summary: Human-readable summary of results
-        - reasoning: Explanation of how the search was interpreted
-        - matchCount: Number of matches
-    """
-    
-    # Step 1: Analyze intent and extract filters
-    llm = get_llm()
-    
-    intent_prompt = """You are an accessibility search analyst.
+
+INTENT_PROMPT = """You are an accessibility search analyst.
 Analyze the user's search query and extract:
 1. The core semantic meaning for vector search
 2. Any explicit filters (severity, category, status)
@@ -72,49 +60,149 @@ Respond with ONLY valid JSON:
 Categories: no_ramp, cracked_sidewalk, obstacle_on_path, overgrown_vegetation, 
 parking_violation, poor_lighting, pothole, slippery_surface, steep_grade, uneven_surface, other"""
 
+# Built once and shared by every call
+INTENT_SYSTEM_MESSAGE = SystemMessage(content=INTENT_PROMPT)
+
+
+async def analyze_intent(query: str) -> Dict[str, Any]:
+    """
+    Turn a raw query into a search plan (semantic query + filters).
+    Clear-cut queries are handled by keyword rules, and LLM plans are cached
+    by normalized query, so most searches skip the LLM.
+    """
+    search_plan = classify_intent(query)
+    if search_plan is not None:
+        logger.debug("Fast intent: %s", search_plan)
+        return search_plan
+    
+    search_plan = await get_cached_intent("search_intent", query)
+    if search_plan is not None:
+        logger.debug("Cached intent: %s", search_plan)
+        return search_plan
+    
+    llm = get_llm()
+    
     try:
-        intent_response = llm.invoke([
-            SystemMessage(content=intent_prompt),
+        intent_response = await llm.ainvoke([
+            INTENT_SYSTEM_MESSAGE,
             HumanMessage(content=query)
         ])
         
         content = intent_response.content.replace('```json', '').replace('```', '').strip()
-        search_plan = json.loads(content)
-        print(f"[SEARCH_AGENT] Parsed intent: {search_plan}")
+        search_plan = orjson.loads(content)
+        logger.debug("Parsed intent: %s", search_plan)
+        await set_cached_intent("search_intent", query, search_plan)
         
     except Exception as e:
-        print(f"[SEARCH_AGENT] Intent parsing failed: {e}")
+        logger.warning("Intent parsing failed: %s", e)
         search_plan = {
             "semantic_query": query,
             "filters": {},
             "reasoning": "Direct search - could not parse structured intent"
         }
     
-    # Step 2: Perform vector search
-    reports = get_all_reports()
-    await build_index(reports)
+    return search_plan
+
+
+# Intent analyses left running after a high-confidence search, so their plans
+# still get cached (the event loop only keeps weak references to tasks)
+_background_tasks: Set[asyncio.Task] = set()
+
+# Whether the index has been built, and the data version it was built against
+_index_built = False
+_index_version = 0
+
+
+async def _retrieve(query: str) -> np.ndarray:
+    """
+    Refresh the index if reports changed, then embed the query.
+    Uses the original query (better semantic matching), so it doesn't
+    depend on intent analysis and can run alongside it.
+    """
+    global _index_built, _index_version
     
-    # Use original query for better semantic matching
-    search_results = await search_similar(query, top_k=15)
-    matching_ids = [r[0] for r in search_results]
-    scores = {r[0]: round(r[1], 3) for r in search_results}
+    data_version = get_data_version()
+    if not _index_built or data_version > _index_version:
+        reports = await get_all_reports()
+        await build_index(reports)
+        _index_built, _index_version = True, data_version
     
-    print(f"[SEARCH_AGENT] Vector search found {len(matching_ids)} candidates")
+    return await embed_query(query)
+
+
+async def _hybrid_search(
+    query: str,
+    query_embedding: np.ndarray,
+    filters: Optional[Dict[str, Any]] = None,
+) -> Tuple[List[Tuple[str, float]], List[Tuple[str, float]]]:
+    """
+    Fuse vector and BM25 results with Reciprocal Rank Fusion.
+    Returns the fused (report_id, score) list and the semantic (cosine) matches.
+    """
+    semantic = await search_vectors(query_embedding, filters, top_k=TOP_K)
+    lexical = search_bm25(query, filters, top_k=TOP_K)
+    return reciprocal_rank_fusion([semantic, lexical])[:TOP_K], semantic
+
+
+async def search_agent_stream(query: str) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Streaming version of search_agent_query.
     
-    # Step 3: Apply filters if specified
-    filters = search_plan.get("filters", {})
+    Yields a partial result ({"partial": True, "matchingIds", "scores"}) with the
+    unfiltered hybrid search candidates as soon as they are available, then the
+    final result (same shape as search_agent_query, with "partial": False) once
+    intent analysis has finished and filters are applied.
+    """
     
-    if filters.get("severity"):
-        severity_result = filter_by_severity.invoke({"severity": filters["severity"]})
-        filter_ids = set(severity_result.get("matching_ids", []))
-        matching_ids = [id for id in matching_ids if id in filter_ids]
-        print(f"[SEARCH_AGENT] After severity filter: {len(matching_ids)}")
+    # Keyword rules and cached plans are applied up front and never skipped; only
+    # the LLM fallback runs alongside the search (steps 1 & 2 are independent)
+    search_plan = classify_intent(query) or await get_cached_intent("search_intent", query)
+    intent_task = asyncio.create_task(analyze_intent(query)) if search_plan is None else None
     
-    if filters.get("category"):
-        category_result = filter_by_category.invoke({"category": filters["category"]})
-        filter_ids = set(category_result.get("matching_ids", []))
-        matching_ids = [id for id in matching_ids if id in filter_ids]
-        print(f"[SEARCH_AGENT] After category filter: {len(matching_ids)}")
+    try:
+        query_embedding = await _retrieve(query)
+        search_results, semantic = await _hybrid_search(query, query_embedding)
+        
+        matching_ids = [r[0] for r in search_results]
+        scores = {r[0]: round(r[1], 4) for r in search_results}
+        
+        logger.debug("Hybrid search found %d candidates", len(matching_ids))
+        yield {"partial": True, "matchingIds": matching_ids, "scores": scores}
+        
+        if intent_task is not None:
+            confident = len(search_results) <= CONFIDENT_MAX_CANDIDATES or (
+                bool(semantic) and all(score > CONFIDENT_SCORE for _, score in semantic)
+            )
+            # BM25 hit counts don't count as confidence: common tokens fill TOP_K
+            # even when the query negates them
+            if not intent_task.done() and confident:
+                # Semantic matches already cover the query; don't wait on the LLM, but
+                # let it finish so the plan is cached for the next time this is asked
+                logger.debug("High-confidence candidates, skipping LLM intent analysis")
+                _background_tasks.add(intent_task)
+                intent_task.add_done_callback(_background_tasks.discard)
+                intent_task = None
+                search_plan = {
+                    "semantic_query": query,
+                    "filters": {},
+                    "reasoning": "High-confidence semantic matches, no filter extraction needed.",
+                }
+            else:
+                search_plan = await intent_task
+        else:
+            logger.debug("Fast or cached intent: %s", search_plan)
+    finally:
+        if intent_task is not None:
+            intent_task.cancel()
+    
+    # Step 3: Apply filters if specified, searching and filtering in one pass
+    filters = search_plan.get("filters") or {}
+    
+    if filters.get("severity") or filters.get("category") or filters.get("status"):
+        search_results, _ = await _hybrid_search(query, query_embedding, filters)
+        matching_ids = [r[0] for r in search_results]
+        scores = {r[0]: round(r[1], 4) for r in search_results}
+        logger.debug("After filters %s: %d", filters, len(matching_ids))
     
     # Step 4: Generate summary
     if matching_ids:
@@ -122,12 +210,39 @@ parking_violation, poor_lighting, pothole, slippery_surface, steep_grade, uneven
     else:
         summary = f"No reports found matching '{query}'."
     
-    return {
+    yield {
+        "partial": False,
         "matchingIds": matching_ids,
         "summary": summary,
         "reasoning": search_plan.get("reasoning", ""),
-        "totalReports": len(reports),
+        "totalReports": get_index_size(),
         "matchCount": len(matching_ids),
         "scores": scores,
         "agent": "search_agent"
     }
+
+
+async def search_agent_query(query: str) -> Dict[str, Any]:
+    """
+    Search for accessibility reports using natural language.
+    
+    This agent:
+    1. Analyzes the query to understand intent and extract filters
+    2. Performs semantic vector search
+    3. Applies any extracted filters
+    4. Returns matching reports with a summary
+    
+    Args:
+        query: Natural language search query (e.g., "missing ramps near campus")
+        
+    Returns:
+        Dictionary with:
+        - matchingIds: List of matching report IDs
+        - summary: Human-readable summary of results
+        - reasoning: Explanation of how the search was interpreted
+        - matchCount: Number of matches
+    """
+    result: Dict[str, Any] = {}
+    async for result in search_agent_stream(query):
+        pass
+    return result
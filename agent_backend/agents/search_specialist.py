@@ -1,46 +1,63 @@
 from langchain_core.messages import ToolMessage
-from tools import vector_search, filter_by_severity, filter_by_category, filter_by_status
-from db import get_all_reports
+from tools import vector_search
+from db import get_reports_by_ids
+from embeddings import matches_filters, embed_query, get_data_version
+from cache import SemanticCache
 from state import AgentState
-import json
+import orjson
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Results for near-duplicate queries (same filters) are reused for an hour
+_result_cache = SemanticCache(threshold=0.97, ttl=3600, maxsize=500)
+_result_cache_version = 0
+
 
 async def search_specialist_node(state: AgentState):
     """
     Agent 2: Search Specialist
     Uses SEMANTIC SIMILARITY to find related reports.
     """
-    search_plan_str = state.get("search_plan")
+    global _result_cache_version
+    
+    search_plan = state.get("search_plan_dict") or {}
     
     # Get the original user query from messages
     messages = state.get("messages", [])
     original_query = messages[0].content if messages else ""
     
-    # Parse search plan for filters
-    filters = {}
-    if search_plan_str:
-        try:
-            search_plan = json.loads(search_plan_str)
-            filters = search_plan.get("filters", {})
-        except:
-            pass
+    filters = search_plan.get("filters") or {}
     
     # USE THE ORIGINAL QUERY - not the transformed one
     # This preserves the semantic meaning better
     query = original_query
     
-    print(f"[SEARCH_SPECIALIST] Using ORIGINAL query: {query}")
-    print(f"[SEARCH_SPECIALIST] Filters: {filters}")
+    logger.debug("Using original query: %s", query)
+    logger.debug("Filters: %s", filters)
+    
+    # Reuse the result of a near-identical earlier query, unless reports changed since
+    if get_data_version() != _result_cache_version:
+        _result_cache.clear()
+        _result_cache_version = get_data_version()
+    
+    query_vec = await embed_query(query)
+    filters_key = orjson.dumps(filters, option=orjson.OPT_SORT_KEYS).decode()
+    cached = _result_cache.get(query_vec, filters_key)
+    if cached is not None:
+        logger.debug("Semantic cache hit for: %s", query)
+        return build_result(state, query, *cached)
     
     # Vector search for semantic similarity
     vector_result = await vector_search.ainvoke({"query": query, "top_k": 15})
     matching_ids = vector_result.get("matching_ids", [])
     scores = vector_result.get("scores", {})
     
-    print(f"[SEARCH_SPECIALIST] Found {len(matching_ids)} semantically similar matches")
+    logger.debug("Found %d semantically similar matches", len(matching_ids))
     
-    # Get category info for results
-    all_reports = get_all_reports()
-    report_map = {r['_id']: r for r in all_reports}
+    # Fetch only the candidates (for category info and filtering)
+    candidates = await get_reports_by_ids(matching_ids)
+    report_map = {r['_id']: r for r in candidates}
     
     categories_found = {}
     for report_id in matching_ids:
@@ -48,32 +65,34 @@ async def search_specialist_node(state: AgentState):
             cat = report_map[report_id].get('content', {}).get('category', 'other')
             categories_found[report_id] = cat
     
-    # Apply filters if provided
+    # Apply filters if provided (only the candidates are checked)
     if filters:
-        if filters.get("severity"):
-            severity_result = filter_by_severity.invoke({"severity": filters["severity"]})
-            filter_ids = set(severity_result.get("matching_ids", []))
-            matching_ids = [id for id in matching_ids if id in filter_ids]
-            
-        if filters.get("category"):
-            category_result = filter_by_category.invoke({"category": filters["category"]})
-            filter_ids = set(category_result.get("matching_ids", []))
-            matching_ids = [id for id in matching_ids if id in filter_ids]
+        matching_ids = [
+            rid for rid in matching_ids
+            if rid in report_map and matches_filters(report_map[rid], filters)
+        ]
     
     # Log what categories we found
-    cat_counts = {}
-    for cat in categories_found.values():
-        cat_counts[cat] = cat_counts.get(cat, 0) + 1
-    print(f"[SEARCH_SPECIALIST] Categories in results: {cat_counts}")
+    if logger.isEnabledFor(logging.DEBUG):
+        cat_counts = {}
+        for cat in categories_found.values():
+            cat_counts[cat] = cat_counts.get(cat, 0) + 1
+        logger.debug("Categories in results: %s", cat_counts)
     
+    _result_cache.set(query_vec, (matching_ids, scores, categories_found), filters_key)
+    return build_result(state, query, matching_ids, scores, categories_found)
+
+
+def build_result(state: AgentState, query: str, matching_ids, scores, categories_found):
+    """Package search results as the node's state update."""
     tool_message = ToolMessage(
-        content=json.dumps({
+        content=orjson.dumps({
             "matching_ids": matching_ids,
             "match_count": len(matching_ids),
             "query": query,
             "scores": scores,
             "categories": categories_found,
-        }),
+        }).decode(),
         tool_call_id="semantic_search"
     )
     
@@ -7,28 +7,50 @@ This agent analyzes a reported barrier and provides:
 3. Priority assessment
 """
 
-import os
-from typing import Dict, Any
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.messages import SystemMessage, HumanMessage
-import json
+import logging
+from typing import Dict, Any, Optional
+from langchain_core.messages import SystemMessage
+import orjson
 
+from agents.batcher import BatchedGeminiClient, strip_json_fences
+from agents.llm import get_llm
 
-def get_llm():
-    """Get the Gemini LLM instance."""
-    api_key = os.getenv('GEMINI_API_KEY')
-    return ChatGoogleGenerativeAI(
-        model="gemini-2.0-flash",
-        google_api_key=api_key,
-        temperature=0.3,
-    )
+logger = logging.getLogger(__name__)
+
+
+SYSTEM_PROMPT = """You are an urban accessibility infrastructure expert.
+Given an accessibility barrier report, provide detailed recommendations for fixing it.
+
+You MUST respond with ONLY a valid JSON object (no markdown) with these fields:
+{
+    "suggestedFix": "detailed description of the recommended fix",
+    "estimatedCost": "low / medium / high",
+    "estimatedTime": "time estimate like '1-2 days' or '2-4 weeks'",
+    "priority": 1-10 score based on severity and impact,
+    "steps": ["step 1", "step 2", "step 3"],
+    "accessibility_impact": "description of how this fix improves accessibility",
+    "standards_reference": "relevant accessibility standards (e.g., ADA, AODA)"
+}
+
+Consider:
+- Local building codes and accessibility regulations
+- Cost-effective solutions
+- Temporary vs permanent fixes
+- Impact on various disability types"""
+
+# Built once and shared by every call
+SYSTEM_MESSAGE = SystemMessage(content=SYSTEM_PROMPT)
+
+# Concurrent requests are sent to Gemini together
+# Suggestions benefit from a little variety
+_batcher = BatchedGeminiClient(lambda: get_llm(temperature=0.3), SYSTEM_MESSAGE)
 
 
 async def solution_agent_generate(
     description: str,
     category: str,
     severity: str,
-    image_base64: str = None,
+    image_bytes: Optional[bytes] = None,
     mime_type: str = "image/jpeg"
 ) -> Dict[str, Any]:
     """
@@ -38,7 +60,7 @@ async def solution_agent_generate(
         description: Description of the accessibility barrier
         category: Category of barrier (e.g., 'no_ramp', 'cracked_sidewalk')
         severity: Severity level ('low', 'medium', 'high')
-        image_base64: Optional base64-encoded image
+        image_bytes: Optional raw image data
         mime_type: MIME type of the image
         
     Returns:
@@ -50,28 +72,6 @@ async def solution_agent_generate(
         - steps: List of implementation steps
         - accessibility_impact: Description of impact once fixed
     """
-    llm = get_llm()
-    
-    system_prompt = """You are an urban accessibility infrastructure expert.
-Given an accessibility barrier report, provide detailed recommendations for fixing it.
-
-You MUST respond with ONLY a valid JSON object (no markdown) with these fields:
-{
-    "suggestedFix": "detailed description of the recommended fix",
-    "estimatedCost": "low / medium / high",
-    "estimatedTime": "time estimate like '1-2 days' or '2-4 weeks'",
-    "priority": 1-10 score based on severity and impact,
-    "steps": ["step 1", "step 2", "step 3"],
-    "accessibility_impact": "description of how this fix improves accessibility",
-    "standards_reference": "relevant accessibility standards (e.g., ADA, AODA)"
-}
-
-Consider:
-- Local building codes and accessibility regulations
-- Cost-effective solutions
-- Temporary vs permanent fixes
-- Impact on various disability types"""
-
     user_message = f"""Accessibility Barrier Report:
 - Category: {category}
 - Severity: {severity}
@@ -80,26 +80,14 @@ Consider:
 Please provide fix recommendations."""
 
     try:
-        messages = [
-            SystemMessage(content=system_prompt),
-        ]
+        message_content = [{"type": "text", "text": user_message}]
         
         # Include image if provided
-        if image_base64:
-            messages.append(HumanMessage(content=[
-                {"type": "text", "text": user_message},
-                {
-                    "type": "image_url",
-                    "image_url": {"url": f"data:{mime_type};base64,{image_base64}"}
-                }
-            ]))
-        else:
-            messages.append(HumanMessage(content=user_message))
-        
-        response = llm.invoke(messages)
+        if image_bytes:
+            message_content.append({"type": "media", "mime_type": mime_type, "data": image_bytes})
         
-        content = response.content.replace('```json', '').replace('```', '').strip()
-        result = json.loads(content)
+        content = await _batcher.submit(message_content)
+        result = orjson.loads(strip_json_fences(content))
         
         return {
             "suggestedFix": result.get("suggestedFix", "Review and address the barrier."),
@@ -113,7 +101,7 @@ Please provide fix recommendations."""
         }
         
     except Exception as e:
-        print(f"[SOLUTION_AGENT] Error: {e}")
+        logger.exception("Solution generation failed")
         return {
             "suggestedFix": "Manual assessment required. Please consult an accessibility specialist.",
             "estimatedCost": "unknown",
@@ -1,6 +1,8 @@
+import logging
 from langchain_core.messages import AIMessage
 from state import AgentState
-import json
+
+logger = logging.getLogger(__name__)
 
 def supervisor_node(state: AgentState):
     """
@@ -10,10 +12,9 @@ def supervisor_node(state: AgentState):
     # The search_specialist already populated matching_ids in state
     matching_ids = state.get("matching_ids", [])
     
-    search_plan_str = state.get("search_plan")
-    search_plan = json.loads(search_plan_str) if search_plan_str else {}
+    search_plan = state.get("search_plan_dict") or {}
     
-    print(f"[SUPERVISOR] Received {len(matching_ids)} matching IDs from search_specialist")
+    logger.debug("Received %d matching IDs from search_specialist", len(matching_ids))
     
     summary = f"Found {len(matching_ids)} reports."
     if not matching_ids:
@@ -6,27 +6,49 @@ to provide a unified interface for the multi-agent system.
 """
 
 import os
+import orjson
+import logging
 import aiohttp
-from typing import Dict, Any, Optional
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.messages import SystemMessage, HumanMessage
+from typing import Dict, Any
+from langchain_core.messages import SystemMessage
+
+from agents.batcher import BatchedGeminiClient, strip_json_fences
+from agents.llm import get_llm
+
+logger = logging.getLogger(__name__)
 
 # Frontend API URL for analyze endpoint
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:3000")
 
 
-def get_llm():
-    """Get the Gemini LLM instance."""
-    api_key = os.getenv('GEMINI_API_KEY')
-    return ChatGoogleGenerativeAI(
-        model="gemini-2.0-flash",
-        google_api_key=api_key,
-        temperature=0,
-    )
+SYSTEM_PROMPT = """You are an accessibility barrier analysis expert. 
+Analyze the provided image and identify any accessibility barriers for people with mobility challenges.
+
+You MUST respond with ONLY a valid JSON object (no markdown, no explanation) with these fields:
+{
+    "category": "one of: no_ramp, cracked_sidewalk, obstacle_on_path, overgrown_vegetation, parking_violation, poor_lighting, pothole, slippery_surface, steep_grade, uneven_surface, other",
+    "severity": "one of: low, medium, high",
+    "title": "short descriptive title (max 50 chars)",
+    "description": "detailed description of the barrier and its impact on accessibility",
+    "suggestedFix": "specific recommendation for fixing this barrier",
+    "confidence": 0.0 to 1.0
+}
+
+Consider:
+- Impact on wheelchair users
+- Impact on people with walkers/canes
+- Visibility and safety concerns
+- Compliance with accessibility standards"""
+
+# Built once and shared by every call
+SYSTEM_MESSAGE = SystemMessage(content=SYSTEM_PROMPT)
+
+# Concurrent analyses are sent to Gemini together
+_batcher = BatchedGeminiClient(get_llm, SYSTEM_MESSAGE)
 
 
 async def vision_agent_analyze(
-    image_base64: str,
+    image_bytes: bytes,
     mime_type: str = "image/jpeg",
     filename: str = "image.jpg"
 ) -> Dict[str, Any]:
@@ -40,7 +62,7 @@ async def vision_agent_analyze(
     4. Suggest potential fixes
     
     Args:
-        image_base64: Base64-encoded image/video data
+        image_bytes: Raw image/video data
         mime_type: MIME type of the file
         filename: Original filename
         
@@ -53,43 +75,15 @@ async def vision_agent_analyze(
         - suggestedFix: Recommended solution
         - confidence: Confidence score (0-1)
     """
-    llm = get_llm()
-    
-    system_prompt = """You are an accessibility barrier analysis expert. 
-Analyze the provided image and identify any accessibility barriers for people with mobility challenges.
-
-You MUST respond with ONLY a valid JSON object (no markdown, no explanation) with these fields:
-{
-    "category": "one of: no_ramp, cracked_sidewalk, obstacle_on_path, overgrown_vegetation, parking_violation, poor_lighting, pothole, slippery_surface, steep_grade, uneven_surface, other",
-    "severity": "one of: low, medium, high",
-    "title": "short descriptive title (max 50 chars)",
-    "description": "detailed description of the barrier and its impact on accessibility",
-    "suggestedFix": "specific recommendation for fixing this barrier",
-    "confidence": 0.0 to 1.0
-}
-
-Consider:
-- Impact on wheelchair users
-- Impact on people with walkers/canes
-- Visibility and safety concerns
-- Compliance with accessibility standards"""
-
     try:
         # Use Gemini's vision capability directly
-        response = llm.invoke([
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=[
-                {"type": "text", "text": "Analyze this image for accessibility barriers:"},
-                {
-                    "type": "image_url",
-                    "image_url": {"url": f"data:{mime_type};base64,{image_base64}"}
-                }
-            ])
+        content = await _batcher.submit([
+            {"type": "text", "text": "Analyze this image for accessibility barriers:"},
+            # Raw bytes go to Gemini as inline data, no base64 data URL round-trip
+            {"type": "media", "mime_type": mime_type, "data": image_bytes}
         ])
         
-        import json
-        content = response.content.replace('```json', '').replace('```', '').strip()
-        result = json.loads(content)
+        result = orjson.loads(strip_json_fences(content))
         
         # Ensure all required fields
         return {
@@ -103,7 +97,7 @@ Consider:
         }
         
     except Exception as e:
-        print(f"[VISION_AGENT] Error: {e}")
+        logger.exception("Vision analysis failed")
         # Fallback response
         return {
             "category": "other",
@@ -0,0 +1,218 @@
+"""
+Query-plan cache for the intent analysis step.
+
+Parsing a search query into a JSON plan costs a full Gemini round-trip, but
+the plan only depends on the query text. Plans are cached in-process (LRU)
+and, when REDIS_URL is set, in Redis so they are shared across workers.
+
+Also provides SemanticCache, which matches queries by embedding similarity
+so near-duplicate wordings can reuse an earlier result.
+"""
+
+import os
+import json
+import logging
+import time
+import hashlib
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+try:
+    import redis
+    import redis.asyncio as aioredis
+except ImportError:  # Redis is optional
+    redis = None
+
+# Load environment variables
+load_dotenv()
+
+# Cache settings (INTENT_CACHE_TTL=0 disables caching)
+INTENT_CACHE_TTL = int(os.getenv('INTENT_CACHE_TTL', '3600'))
+INTENT_CACHE_SIZE = 1024
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a query so trivially different spellings share a cache entry."""
+    return ' '.join(query.strip().lower().split())
+
+
+def query_hash(query: str) -> str:
+    """Stable hash of the normalized query, used as the cache key."""
+    return hashlib.blake2b(normalize_query(query).encode(), digest_size=16).hexdigest()
+
+
+class LRUCache:
+    """Small in-process LRU cache with per-entry expiry."""
+
+    def __init__(self, maxsize: int, ttl: int):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+
+class SemanticCache:
+    """
+    Cache keyed by query embedding: a lookup hits when a stored vector has
+    cosine similarity >= threshold with the query vector. Entries also carry
+    an exact-match key (e.g. serialized filters) that must be equal to hit.
+    """
+
+    def __init__(self, threshold: float, ttl: int, maxsize: int):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._vectors: List[np.ndarray] = []
+        self._matrix: Optional[np.ndarray] = None  # _vectors stacked, rebuilt after changes
+        self._entries: List[Tuple[str, Any, float]] = []  # (key, value, expires_at)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def get(self, vector: np.ndarray, key: str = "") -> Optional[Any]:
+        value = self._lookup(vector, key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def _lookup(self, vector: np.ndarray, key: str) -> Optional[Any]:
+        if not self._vectors:
+            return None
+        if self._matrix is None:
+            self._matrix = np.stack(self._vectors)
+        vector = vector / (np.linalg.norm(vector) or 1.0)
+        similarities = self._matrix @ vector
+        now = time.monotonic()
+        for i in np.argsort(-similarities):
+            if similarities[i] < self.threshold:
+                break
+            entry_key, value, expires_at = self._entries[i]
+            if entry_key == key and expires_at >= now:
+                return value
+        return None
+
+    def set(self, vector: np.ndarray, value: Any, key: str = "") -> None:
+        now = time.monotonic()
+        # Drop expired entries, then the oldest ones if still full
+        live = [i for i, (_, _, expires_at) in enumerate(self._entries) if expires_at >= now]
+        live = live[-(self.maxsize - 1):] if self.maxsize > 1 else []
+        self._vectors = [self._vectors[i] for i in live]
+        self._entries = [self._entries[i] for i in live]
+
+        self._vectors.append(vector / (np.linalg.norm(vector) or 1.0))
+        self._entries.append((key, value, now + self.ttl))
+        self._matrix = None
+
+    def clear(self) -> None:
+        self._vectors.clear()
+        self._entries.clear()
+        self._matrix = None
+
+
+class RedisCache:
+    """Thin JSON wrapper around an asyncio Redis client (never blocks the event loop)."""
+
+    def __init__(self, url: str, ttl: int):
+        self.ttl = ttl
+        self._client = aioredis.Redis.from_url(url, socket_timeout=0.2)
+
+    async def get(self, key: str) -> Optional[Any]:
+        try:
+            raw = await self._client.get(key)
+        except redis.RedisError as e:
+            logger.warning("Redis get failed: %s", e)
+            return None
+        return json.loads(raw) if raw else None
+
+    async def set(self, key: str, value: Any) -> None:
+        try:
+            await self._client.set(key, json.dumps(value), ex=self.ttl)
+        except redis.RedisError as e:
+            logger.warning("Redis set failed: %s", e)
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+_local_cache = LRUCache(INTENT_CACHE_SIZE, INTENT_CACHE_TTL)
+_redis_cache: Optional[RedisCache] = None
+
+
+def get_redis_cache() -> Optional[RedisCache]:
+    """Get the shared Redis cache if REDIS_URL is configured (singleton pattern)."""
+    global _redis_cache
+    if _redis_cache is None and redis is not None and os.getenv('REDIS_URL'):
+        _redis_cache = RedisCache(os.environ['REDIS_URL'], INTENT_CACHE_TTL)
+    return _redis_cache
+
+
+async def close_redis_cache() -> None:
+    """Close the shared Redis connection pool, if one was opened."""
+    global _redis_cache
+    if _redis_cache is not None:
+        await _redis_cache.close()
+        _redis_cache = None
+
+
+async def get_cached_intent(namespace: str, query: str) -> Optional[Dict[str, Any]]:
+    """
+    Look up a cached search plan.
+    The namespace separates plans produced by different prompts.
+    """
+    if INTENT_CACHE_TTL <= 0:
+        return None
+
+    key = f"{namespace}:{query_hash(query)}"
+    plan = _local_cache.get(key)
+    if plan is not None:
+        return plan
+
+    remote = get_redis_cache()
+    if remote is not None:
+        plan = await remote.get(key)
+        if plan is not None:
+            _local_cache.set(key, plan)
+    return plan
+
+
+async def set_cached_intent(namespace: str, query: str, plan: Dict[str, Any]) -> None:
+    """Store a successfully parsed search plan."""
+    if INTENT_CACHE_TTL <= 0:
+        return
+
+    key = f"{namespace}:{query_hash(query)}"
+    _local_cache.set(key, plan)
+
+    remote = get_redis_cache()
+    if remote is not None:
+        await remote.set(key, plan)
@@ -1,66 +1,180 @@
 """
 Database connection module for MongoDB.
 Reuses the same MongoDB Atlas connection as the Next.js frontend.
+Uses the async Motor driver, so queries never block the event loop.
 """
 
 import os
-from typing import List, Dict, Any, Optional
-from pymongo import MongoClient
-from pymongo.database import Database
+import time
+import hashlib
+import logging
+from typing import List, Dict, Any, Optional, Tuple, Callable
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
 from dotenv import load_dotenv
 
 # Load environment variables from local .env file
 load_dotenv()
 
-_client: Optional[MongoClient] = None
+logger = logging.getLogger(__name__)
 
+_client: Optional[AsyncIOMotorClient] = None
 
-def get_client() -> MongoClient:
-    """Get or create MongoDB client (singleton pattern)."""
+# Fields the agents read from a report (search text, filters, stats, location).
+# Media URLs, image metadata etc. are never fetched.
+REPORT_PROJECTION = {
+    'content.title': 1,
+    'content.description': 1,
+    'content.category': 1,
+    'content.severity': 1,
+    'content.suggestedFix': 1,
+    'aiDraft.title': 1,
+    'aiDraft.description': 1,
+    'aiDraft.category': 1,
+    'aiDraft.severity': 1,
+    'aiDraft.suggestedFix': 1,
+    'status': 1,
+    'location': 1,
+    'updatedAt': 1,
+}
+
+# Atlas Vector Search index over reports.embedding (similarity: cosine), with
+# content.category, content.severity and status indexed as filter fields
+ATLAS_VECTOR_INDEX = os.getenv('ATLAS_VECTOR_INDEX', 'reports_vec')
+
+# Cached result of get_all_reports, tagged with the version and time it was fetched at.
+# Entries expire after REPORTS_CACHE_TTL seconds, so writes made elsewhere (e.g. by
+# the frontend) show up even without a change stream.
+REPORTS_CACHE_TTL = float(os.getenv('REPORTS_CACHE_TTL', '30'))
+
+# get_all_reports loads the newest REPORTS_LIMIT reports; filter_reports returns up to FILTER_LIMIT
+REPORTS_LIMIT = 100
+FILTER_LIMIT = 500
+_reports_version = 0
+_reports_cache: Optional[Tuple[int, float, List[Dict[str, Any]]]] = None
+_reports_generation = 0  # Bumped on every fetch, so callers can cache data derived from the list
+
+
+def get_client() -> AsyncIOMotorClient:
+    """
+    Get or create MongoDB client (singleton pattern).
+    The pool keeps a few warm connections and drops idle ones after a minute.
+    """
     global _client
     if _client is None:
         uri = os.getenv('MONGODB_URI')
         if not uri:
             raise ValueError("MONGODB_URI environment variable is required")
-        _client = MongoClient(uri)
+        _client = AsyncIOMotorClient(
+            uri,
+            maxPoolSize=50,
+            minPoolSize=5,
+            maxIdleTimeMS=60000,
+            serverSelectionTimeoutMS=3000,
+        )
     return _client
 
 
-def get_database() -> Database:
+def get_database() -> AsyncIOMotorDatabase:
     """Get the mobilify database."""
     return get_client()['mobilify']
 
 
-def get_all_reports() -> List[Dict[str, Any]]:
+async def get_all_reports() -> List[Dict[str, Any]]:
     """
-    Fetch all reports from MongoDB.
+    Fetch the most recent reports from MongoDB (agent fields only, see REPORT_PROJECTION).
     Returns list of report documents with string IDs.
+    The result is cached for REPORTS_CACHE_TTL seconds, or until
+    invalidate_reports_cache() is called.
     """
+    global _reports_cache, _reports_generation
+    
+    version = _reports_version
+    if reports_cache_valid():
+        return list(_reports_cache[2])
+    
     db = get_database()
-    reports = list(db['reports'].find({}).limit(100))
+    reports = await db['reports'].find({}, REPORT_PROJECTION).sort('createdAt', -1).to_list(length=REPORTS_LIMIT)
     
     # Convert ObjectId to string for JSON serialization
     for report in reports:
         report['_id'] = str(report['_id'])
     
-    return reports
+    _reports_cache = (version, time.monotonic() + REPORTS_CACHE_TTL, reports)
+    _reports_generation += 1
+    return list(reports)
+
+
+def reports_fingerprint(reports: List[Dict[str, Any]]) -> str:
+    """
+    Cheap fingerprint of a report list: reports only change by being added,
+    deleted or updated (which bumps updatedAt).
+    """
+    last_updated = max((str(r.get('updatedAt', '')) for r in reports), default='')
+    return hashlib.blake2b(f"{len(reports)}:{last_updated}".encode(), digest_size=8).hexdigest()
+
+
+def get_reports_generation() -> int:
+    """Identifies the report list last returned by get_all_reports (changes on every refetch)."""
+    return _reports_generation
+
+
+def reports_cache_valid() -> bool:
+    """Whether the cached report list is current (same version, not expired)."""
+    return (
+        _reports_cache is not None
+        and _reports_cache[0] == _reports_version
+        and _reports_cache[1] > time.monotonic()
+    )
+
+
+def invalidate_reports_cache() -> None:
+    """Drop the cached report list after reports are created, updated or deleted."""
+    global _reports_version
+    _reports_version += 1
 
 
-def get_reports_by_ids(ids: List[str]) -> List[Dict[str, Any]]:
-    """Fetch specific reports by their IDs."""
+async def watch_reports(on_change: Optional[Callable[[], None]] = None) -> None:
+    """
+    Invalidate the report cache whenever a report is inserted, updated or deleted,
+    using a MongoDB change stream. Runs until cancelled; if change streams are
+    unavailable (e.g. standalone server) it logs once and returns, leaving the TTL
+    as the only expiry.
+    """
+    pipeline = [{'$match': {'operationType': {'$in': ['insert', 'update', 'replace', 'delete']}}}]
+    try:
+        async with get_database()['reports'].watch(pipeline) as stream:
+            async for _ in stream:
+                invalidate_reports_cache()
+                if on_change is not None:
+                    on_change()
+    except Exception as e:
+        logger.warning("Report change stream stopped, relying on cache TTL: %s", e)
+
+
+async def get_reports_by_ids(ids: List[str]) -> List[Dict[str, Any]]:
+    """
+    Fetch specific reports by their IDs.
+    Reports already in the get_all_reports cache are served from memory;
+    only the rest are queried.
+    """
     from bson import ObjectId
-    db = get_database()
     
-    object_ids = [ObjectId(id) for id in ids if ObjectId.is_valid(id)]
-    reports = list(db['reports'].find({'_id': {'$in': object_ids}}))
+    found: Dict[str, Dict[str, Any]] = {}
+    if reports_cache_valid():
+        wanted = set(ids)
+        found = {r['_id']: r for r in _reports_cache[2] if r['_id'] in wanted}
     
-    for report in reports:
-        report['_id'] = str(report['_id'])
+    object_ids = [ObjectId(id) for id in ids if id not in found and ObjectId.is_valid(id)]
+    if object_ids:
+        db = get_database()
+        async for report in db['reports'].find({'_id': {'$in': object_ids}}, REPORT_PROJECTION):
+            report['_id'] = str(report['_id'])
+            found[report['_id']] = report
     
-    return reports
+    return [found[id] for id in ids if id in found]
 
 
-def filter_reports(
+async def filter_reports(
     category: Optional[str] = None,
     severity: Optional[str] = None,
     status: Optional[str] = None,
@@ -78,9 +192,53 @@ def filter_reports(
     if status:
         query['status'] = status
     
-    reports = list(db['reports'].find(query).sort('createdAt', -1).limit(500))
+    reports = await db['reports'].find(query, REPORT_PROJECTION).sort('createdAt', -1).to_list(length=FILTER_LIMIT)
     
     for report in reports:
         report['_id'] = str(report['_id'])
     
     return reports
+
+
+async def store_report_embeddings(embeddings: Dict[str, List[float]]) -> None:
+    """Write report embeddings back to their documents (for Atlas Vector Search)."""
+    from bson import ObjectId
+    from pymongo import UpdateOne
+    
+    operations = [
+        UpdateOne({'_id': ObjectId(id)}, {'$set': {'embedding': vector}})
+        for id, vector in embeddings.items() if ObjectId.is_valid(id)
+    ]
+    if operations:
+        await get_database()['reports'].bulk_write(operations, ordered=False)
+
+
+async def vector_search_reports(
+    query_vector: List[float],
+    top_k: int = 20,
+    num_candidates: int = 100,
+    filter: Optional[Dict[str, Any]] = None,
+) -> List[Tuple[str, float]]:
+    """
+    Nearest-neighbour search with Atlas $vectorSearch.
+    filter is an MQL pre-filter on fields indexed as "filter" in the vector
+    index (content.category, content.severity, status).
+    Returns (report_id, score) pairs, best first; scores are Atlas'
+    normalized cosine scores in [0, 1].
+    """
+    db = get_database()
+    vector_search = {
+        'index': ATLAS_VECTOR_INDEX,
+        'path': 'embedding',
+        'queryVector': query_vector,
+        'numCandidates': max(num_candidates, top_k),
+        'limit': top_k,
+    }
+    if filter:
+        vector_search['filter'] = filter
+    pipeline = [
+        {'$vectorSearch': vector_search},
+        {'$project': {'score': {'$meta': 'vectorSearchScore'}}},
+    ]
+    results = await db['reports'].aggregate(pipeline).to_list(length=top_k)
+    return [(str(doc['_id']), doc['score']) for doc in results]
@@ -4,23 +4,111 @@ Uses Gemini's free text-embedding-004 model for embeddings.
 """
 
 import os
+import re
+import asyncio
+import pickle
+import hashlib
+import shelve
+import logging
 import numpy as np
 import faiss
+from concurrent.futures import ThreadPoolExecutor
+import xxhash
+from rank_bm25 import BM25Okapi
 from typing import List, Dict, Any, Optional, Tuple
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from dotenv import load_dotenv
 
+from cache import LRUCache, query_hash
+from db import store_report_embeddings, vector_search_reports
+
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Embedding model (free tier)
 EMBEDDING_MODEL = "models/text-embedding-004"
 EMBEDDING_DIM = 768  # Gemini embedding dimension
 
+# Documents per batchEmbedContents request when (re)indexing (API maximum)
+EMBED_BATCH_SIZE = 100
+
+# On-disk embedding cache (keyed by text hash), so unchanged text is never re-embedded
+EMBED_CACHE_PATH = os.getenv('EMBED_CACHE_PATH', '.embcache')
+
+# On-disk copy of the FAISS index and its ID metadata, so a restart doesn't re-index
+INDEX_PATH = os.getenv('INDEX_PATH', '.faiss_index.bin')
+META_PATH = os.getenv('INDEX_META_PATH', '.faiss_meta.pkl')
+
+# Serve the semantic leg of every search from MongoDB Atlas $vectorSearch instead of
+# the local index. Requires a vector index (cosine) on reports.embedding with
+# content.category/content.severity/status as filter fields; build_index writes the vectors.
+USE_ATLAS_VECTOR = os.getenv('USE_ATLAS_VECTOR', '').lower() in ('1', 'true', 'yes')
+
+# Reciprocal Rank Fusion constant (score = sum of 1 / (RRF_K + rank))
+RRF_K = 60
+
+# Characters of each report's search text kept for the debug endpoint
+SEARCH_PREVIEW_CHARS = 200
+
+# Extra neighbours fetched per requested result when search filters are applied
+FILTER_OVERFETCH = 5
+
+# HNSW graph parameters (approximate nearest neighbour search)
+HNSW_M = 32  # Neighbours per node
+HNSW_EF_CONSTRUCTION = 200  # Candidate list size while inserting (graph quality vs build time)
+HNSW_EF_SEARCH = 64  # Candidate list size at query time (recall vs speed)
+
+# Below this many vectors, search is an exact matrix-vector product over a plain
+# float32 copy; the HNSW graph only pays off for larger corpora
+EXACT_SEARCH_MAX = int(os.getenv('EXACT_SEARCH_MAX', '10000'))
+
+# Vectors are stored as 8-bit codes (1 byte per dimension instead of 4) by default.
+# A single value range shared by all dimensions is learned from the first batch;
+# per-dimension ranges learned from a handful of reports would clip later vectors.
+# INDEX_QUANTIZER=fp16 trades twice the memory for near-exact scores.
+QUANTIZER_TYPES = {
+    '8bit': faiss.ScalarQuantizer.QT_8bit_uniform,
+    'fp16': faiss.ScalarQuantizer.QT_fp16,
+}
+QUANTIZER_TYPE = QUANTIZER_TYPES[os.getenv('INDEX_QUANTIZER', '8bit').lower()]
+
 # In-memory FAISS index and metadata
-_index: Optional[faiss.IndexFlatIP] = None  # Inner product for cosine similarity
-_id_map: List[str] = []  # Maps FAISS index positions to report IDs
-_text_cache: Dict[str, str] = {}  # Maps report IDs to their text (for cache invalidation)
+_index: Optional[faiss.IndexHNSWSQ] = None  # Inner product for cosine similarity
+_all_vectors: Optional[np.ndarray] = None  # Normalized vectors by position, kept while small (see EXACT_SEARCH_MAX)
+_id_map: List[Optional[str]] = []  # Maps FAISS index positions to report IDs (None = stale)
+_positions: Dict[str, int] = {}  # Maps report IDs to their current FAISS position
+_text_hashes: Dict[str, int] = {}  # Maps report IDs to a 64-bit hash of their text (for cache invalidation)
+_reports: Dict[str, Dict[str, Any]] = {}  # Maps report IDs to the report documents last indexed
+_search_previews: Dict[str, str] = {}  # Maps report IDs to the start of their search text (debug endpoint)
+_stale_count = 0  # Number of positions left behind by updated/deleted reports
+_atlas_backfilled = False  # Whether every live vector has been written to Atlas (USE_ATLAS_VECTOR)
+
+# Inverted indexes over the indexed reports: field value -> report IDs (newest first)
+_by_category: Dict[str, List[str]] = {}
+_by_severity: Dict[str, List[str]] = {}
+_by_status: Dict[str, List[str]] = {}
+
+# Lexical (BM25) index over the same report texts, for hybrid search
+_bm25: Optional[BM25Okapi] = None
+_bm25_ids: List[str] = []  # Maps BM25 document positions to report IDs
+
+# Embedding cache: in-memory dict backed by a shelve file. Every shelf access runs
+# on one dedicated thread: some dbm backends (dbm.sqlite3, the default on Python
+# 3.13) only work in the thread that opened them.
+_emb_cache: Dict[str, np.ndarray] = {}
+_emb_store: Optional[shelve.Shelf] = None
+_emb_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='embcache')
+
+# Query embeddings: bounded in-memory LRU keyed by normalized query (not persisted)
+QUERY_CACHE_SIZE = 1024
+QUERY_CACHE_TTL = 3600
+_query_cache = LRUCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL)
+
+# Bumped whenever reports change, so callers know the index needs a refresh
+_data_version = 0
+_build_lock = asyncio.Lock()
 
 
 def get_embeddings_model() -> GoogleGenerativeAIEmbeddings:
@@ -35,6 +123,15 @@ def get_embeddings_model() -> GoogleGenerativeAIEmbeddings:
     )
 
 
+async def embed_document_batch(texts: List[str]) -> List[List[float]]:
+    """Embed up to EMBED_BATCH_SIZE documents in a single batchEmbedContents request."""
+    return await get_embeddings_model().aembed_documents(
+        texts,
+        batch_size=EMBED_BATCH_SIZE,
+        task_type="RETRIEVAL_DOCUMENT",
+    )
+
+
 def build_report_text(report: Dict[str, Any]) -> str:
     """
     Build searchable text for a report (used for embedding).
@@ -50,67 +147,449 @@ def build_report_text(report: Dict[str, Any]) -> str:
     fix = content.get('suggestedFix') or ai_draft.get('suggestedFix') or ''
     
     text = f"{title}. {category}. {severity} severity. {description} {fix}".strip()
-    # Debug: show first 100 chars of each report text
-    print(f"[EMBED] {report.get('_id', 'unknown')[:8]}: {text[:100]}...")
+    # Debug: show first 100 chars of each report text (LOG_LEVEL=DEBUG)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("%s: %s...", report.get('_id', 'unknown')[:8], text[:100])
     return text
 
 
-def normalize_vectors(vectors: np.ndarray) -> np.ndarray:
-    """Normalize vectors for cosine similarity using inner product."""
+def build_lexical_text(report: Dict[str, Any]) -> str:
+    """
+    Build the BM25 text for a report: title, description and suggested fix only.
+    The category and severity labels are left out - they are shared by many
+    reports, so a query mentioning "high" or "pothole" would score every report
+    carrying that label; search filters handle those fields instead.
+    """
+    content = report.get('content', {})
+    ai_draft = report.get('aiDraft', {})
+    
+    title = content.get('title') or ai_draft.get('title') or ''
+    description = content.get('description') or ai_draft.get('description') or ''
+    fix = content.get('suggestedFix') or ai_draft.get('suggestedFix') or ''
+    return f"{title}. {description} {fix}".strip()
+
+
+def get_embedding_store() -> shelve.Shelf:
+    """Get the on-disk embedding cache (opened lazily; call from the cache thread only)."""
+    global _emb_store
+    if _emb_store is None:
+        _emb_store = shelve.open(EMBED_CACHE_PATH)
+    return _emb_store
+
+
+async def run_in_cache_thread(func, *args):
+    """Run a blocking embedding-cache function on the cache thread."""
+    return await asyncio.get_running_loop().run_in_executor(_emb_executor, func, *args)
+
+
+def _close_store() -> None:
+    global _emb_store
+    if _emb_store is not None:
+        _emb_store.close()
+        _emb_store = None
+
+
+def close_embedding_cache() -> None:
+    """Flush and close the on-disk embedding cache (blocks until closed)."""
+    _emb_executor.submit(_close_store).result()
+
+
+def embedding_cache_key(kind: str, text: str) -> str:
+    """
+    Cache key for a text embedding.
+    Queries and documents are embedded with different task types, so the kind is part of the key.
+    """
+    return hashlib.sha1(f"{kind}:{text}".encode()).hexdigest()
+
+
+def get_cached_embeddings(keys: List[str]) -> List[Optional[np.ndarray]]:
+    """Look up several embeddings (blocking)."""
+    return [get_cached_embedding(key) for key in keys]
+
+
+def get_cached_embedding(key: str) -> Optional[np.ndarray]:
+    """Look up an embedding in memory, then on disk."""
+    vector = _emb_cache.get(key)
+    if vector is None:
+        store = get_embedding_store()
+        if key in store:
+            vector = store[key]
+            _emb_cache[key] = vector
+    return vector
+
+
+def set_cached_embedding(key: str, vector: np.ndarray) -> None:
+    """Store an embedding in memory and on disk."""
+    _emb_cache[key] = vector
+    get_embedding_store()[key] = vector
+
+
+def store_cached_embeddings(keys: List[str], vectors: List[np.ndarray]) -> None:
+    """Store several embeddings and flush the on-disk cache (blocking)."""
+    for key, vector in zip(keys, vectors):
+        set_cached_embedding(key, vector)
+    get_embedding_store().sync()
+
+
+async def embed_documents(texts: List[str]) -> np.ndarray:
+    """
+    Embed document texts, reusing cached vectors for text seen before.
+    Misses are embedded with one batchEmbedContents request per
+    EMBED_BATCH_SIZE texts, sent concurrently; results keep the input order.
+    Disk cache reads and writes run on the cache thread.
+    """
+    keys = [embedding_cache_key("document", text) for text in texts]
+    vectors = await run_in_cache_thread(get_cached_embeddings, keys)
+    missing = [i for i, vector in enumerate(vectors) if vector is None]
+    
+    if missing:
+        batches = [missing[i:i + EMBED_BATCH_SIZE] for i in range(0, len(missing), EMBED_BATCH_SIZE)]
+        results = await asyncio.gather(*(
+            embed_document_batch([texts[i] for i in batch])
+            for batch in batches
+        ))
+        for batch, embeddings in zip(batches, results):
+            for i, embedding in zip(batch, embeddings):
+                vectors[i] = np.array(embedding, dtype=np.float32)
+        await run_in_cache_thread(store_cached_embeddings, [keys[i] for i in missing], [vectors[i] for i in missing])
+    
+    return np.array(vectors, dtype=np.float32)
+
+
+async def embed_query(query: str) -> np.ndarray:
+    """
+    Embed a search query, reusing the cached vector for repeat queries.
+    Queries differing only in case or whitespace share an entry.
+    """
+    key = query_hash(query)
+    vector = _query_cache.get(key)
+    if vector is None:
+        model = get_embeddings_model()
+        vector = np.array(await model.aembed_query(query), dtype=np.float32)
+        _query_cache.set(key, vector)
+    return vector
+
+
+def new_index() -> faiss.IndexHNSWSQ:
+    """
+    Create an empty HNSW index over scalar-quantized vectors, using inner
+    product (cosine on normalized vectors). Must be trained before adding.
+    """
+    index = faiss.IndexHNSWSQ(EMBEDDING_DIM, QUANTIZER_TYPE, HNSW_M, faiss.METRIC_INNER_PRODUCT)
+    index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    index.hnsw.efSearch = HNSW_EF_SEARCH
+    return index
+
+
+def normalize_vectors(vectors: np.ndarray, copy: bool = True) -> np.ndarray:
+    """
+    Normalize float32 vectors for cosine similarity using inner product.
+    With copy=False the rows are scaled in place (the caller must own the array).
+    """
+    if copy:
+        vectors = vectors.copy()
     norms = np.linalg.norm(vectors, axis=1, keepdims=True)
-    norms[norms == 0] = 1  # Avoid division by zero
-    return vectors / norms
+    np.maximum(norms, 1e-12, out=norms)  # Avoid division by zero
+    np.divide(vectors, norms, out=vectors)
+    return vectors
 
 
 async def build_index(reports: List[Dict[str, Any]], force_rebuild: bool = False) -> int:
     """
     Build or update the FAISS index from reports.
+    Only new or changed reports are embedded; vectors of changed or deleted
+    reports are marked stale and skipped at search time, until they outnumber
+    the live ones and the index is rebuilt from cached embeddings.
     Returns the number of indexed reports.
     """
-    global _index, _id_map, _text_cache
+    async with _build_lock:
+        return await _build_index(reports, force_rebuild)
+
+
+async def _build_index(reports: List[Dict[str, Any]], force_rebuild: bool) -> int:
+    global _index, _all_vectors, _id_map, _positions, _text_hashes, _search_previews, _stale_count, _atlas_backfilled
     
     if not reports:
         return 0
     
     # Check which reports need (re)embedding
     reports_to_embed = []
+    report_texts = {}
+    text_hashes = {}
     for report in reports:
         report_id = report['_id']
         text = build_report_text(report)
+        report_texts[report_id] = text
+        text_hashes[report_id] = xxhash.xxh3_64_intdigest(text.encode())
         
-        if force_rebuild or report_id not in _text_cache or _text_cache[report_id] != text:
+        if force_rebuild or _text_hashes.get(report_id) != text_hashes[report_id]:
             reports_to_embed.append((report_id, text))
+    _search_previews = {report_id: text[:SEARCH_PREVIEW_CHARS] for report_id, text in report_texts.items()}
     
-    if not reports_to_embed and _index is not None:
-        # No updates needed
-        return len(_id_map)
+    # Retire reports that were deleted from the database
+    deleted_ids = [rid for rid in _positions if rid not in report_texts]
+    for report_id in deleted_ids:
+        _id_map[_positions.pop(report_id)] = None
+        _text_hashes.pop(report_id, None)
+        _stale_count += 1
     
-    # If we need to rebuild, start fresh
-    if force_rebuild or _index is None:
-        _index = faiss.IndexFlatIP(EMBEDDING_DIM)
-        _id_map = []
-        _text_cache = {}
-        reports_to_embed = [(r['_id'], build_report_text(r)) for r in reports]
+    # BM25 has no incremental updates, but rebuilding it is cheap (no API calls)
+    if reports_to_embed or deleted_ids or _bm25 is None:
+        build_bm25({report['_id']: build_lexical_text(report) for report in reports})
+    
+    # Compact once dead positions would outnumber live ones, so stale vectors
+    # don't pile up in the saved index. Unchanged texts come from the embedding
+    # cache, so a compaction costs no API calls.
+    replaced = sum(1 for report_id, _ in reports_to_embed if report_id in _positions)
+    compact = _index is not None and _stale_count + replaced > len(report_texts)
     
-    if not reports_to_embed:
-        return len(_id_map)
+    # The first Atlas-enabled build in a process re-adds every report (from the
+    # embedding cache) so vectors indexed before the flag was set reach Atlas too
+    backfill = USE_ATLAS_VECTOR and not _atlas_backfilled
+    
+    if not reports_to_embed and _index is not None and not compact and not backfill:
+        # No updates needed
+        publish_reports(reports)
+        return len(_positions)
+    
+    rebuild = force_rebuild or _index is None or compact or backfill
+    if rebuild:
+        if compact:
+            logger.info("Compacting index (%d stale positions)", _stale_count + replaced)
+        reports_to_embed = list(report_texts.items())
     
     # Generate embeddings
-    model = get_embeddings_model()
     texts = [text for _, text in reports_to_embed]
+    embeddings_array = normalize_vectors(await embed_documents(texts), copy=False)
     
-    # Batch embed (LangChain handles batching internally)
-    embeddings = await model.aembed_documents(texts)
-    embeddings_array = normalize_vectors(np.array(embeddings, dtype=np.float32))
+    # Write to Atlas before recording the text hashes, so a failed write is
+    # retried by the next build instead of leaving reports without a vector
+    if USE_ATLAS_VECTOR:
+        await store_report_embeddings({
+            report_id: vector.tolist()
+            for (report_id, _), vector in zip(reports_to_embed, embeddings_array)
+        })
+        _atlas_backfilled = True
     
-    # Add to index
+    # If we need to rebuild, start fresh (only now, so searches never see an empty index)
+    if rebuild:
+        _index = new_index()
+        _all_vectors = np.empty((0, EMBEDDING_DIM), dtype=np.float32)
+        _id_map = []
+        _positions = {}
+        _text_hashes = {}
+        _stale_count = 0
+    
+    # Add to index (a fresh index learns its quantizer range from this batch)
+    if not _index.is_trained:
+        _index.train(embeddings_array)
     _index.add(embeddings_array)
+    if _all_vectors is not None and _index.ntotal <= EXACT_SEARCH_MAX:
+        _all_vectors = np.vstack([_all_vectors, embeddings_array])
+    else:
+        _all_vectors = None
     
-    for report_id, text in reports_to_embed:
+    for report_id, _ in reports_to_embed:
+        # An updated report leaves its old vector behind; mark it stale
+        if report_id in _positions:
+            _id_map[_positions[report_id]] = None
+            _stale_count += 1
+        _positions[report_id] = len(_id_map)
         _id_map.append(report_id)
-        _text_cache[report_id] = text
+        _text_hashes[report_id] = text_hashes[report_id]
+    # Only now that the vectors are in: a failed embedding call leaves the index not ready
+    publish_reports(reports)
     
-    return len(_id_map)
+    # Searches keep running while the index is written out (it is only read)
+    await asyncio.to_thread(save_index)
+    return len(_positions)
+
+
+def publish_reports(reports: List[Dict[str, Any]]) -> None:
+    """Make the reports visible to filters and is_index_ready()."""
+    global _reports
+    _reports = {report['_id']: report for report in reports}
+    build_filter_maps(reports)
+
+
+def build_filter_maps(reports: List[Dict[str, Any]]) -> None:
+    """Rebuild the category/severity/status lookup maps in one pass over the reports."""
+    global _by_category, _by_severity, _by_status
+    by_category: Dict[str, List[str]] = {}
+    by_severity: Dict[str, List[str]] = {}
+    by_status: Dict[str, List[str]] = {}
+    
+    for report in reports:
+        report_id = report['_id']
+        content = report.get('content', {})
+        if content.get('category'):
+            by_category.setdefault(content['category'], []).append(report_id)
+        if content.get('severity'):
+            by_severity.setdefault(content['severity'], []).append(report_id)
+        if report.get('status'):
+            by_status.setdefault(report['status'], []).append(report_id)
+    
+    _by_category, _by_severity, _by_status = by_category, by_severity, by_status
+
+
+def get_by_category(category: str) -> List[str]:
+    """IDs of indexed reports in a category."""
+    return _by_category.get(category, [])
+
+
+def get_by_severity(severity: str) -> List[str]:
+    """IDs of indexed reports with a severity."""
+    return _by_severity.get(severity, [])
+
+
+def get_by_status(status: str) -> List[str]:
+    """IDs of indexed reports with a status."""
+    return _by_status.get(status, [])
+
+
+def save_index() -> None:
+    """Write the FAISS index and its ID metadata to disk."""
+    if _index is None:
+        return
+    
+    # Write to temporary files first so a crash never leaves a half-written pair
+    faiss.write_index(_index, INDEX_PATH + '.tmp')
+    with open(META_PATH + '.tmp', 'wb') as f:
+        pickle.dump((_id_map, _positions, _text_hashes, _stale_count), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(INDEX_PATH + '.tmp', INDEX_PATH)
+    os.replace(META_PATH + '.tmp', META_PATH)
+
+
+def _load_from_disk() -> None:
+    """
+    Restore the index saved by a previous run, if any.
+    The next build_index call then only embeds reports that changed meanwhile.
+    """
+    global _index, _all_vectors, _id_map, _positions, _text_hashes, _stale_count
+    
+    if not (os.path.exists(INDEX_PATH) and os.path.exists(META_PATH)):
+        return
+    
+    try:
+        index = faiss.read_index(INDEX_PATH)
+        with open(META_PATH, 'rb') as f:
+            id_map, positions, text_hashes, stale_count = pickle.load(f)
+    except Exception as e:
+        logger.warning("Could not load saved index, rebuilding: %s", e)
+        return
+    
+    if index.ntotal != len(id_map):
+        logger.warning("Saved index and metadata disagree, rebuilding")
+        return
+    
+    index.hnsw.efSearch = HNSW_EF_SEARCH
+    if index.ntotal <= EXACT_SEARCH_MAX:
+        _all_vectors = index.reconstruct_n(0, index.ntotal)
+    _index, _id_map, _positions, _text_hashes, _stale_count = index, id_map, positions, text_hashes, stale_count
+    logger.info("Loaded saved index with %d reports", len(_positions))
+
+
+# Words that appear in (almost) every report text or query and only add noise to BM25
+_STOPWORDS = frozenset({
+    'a', 'an', 'and', 'are', 'at', 'by', 'for', 'from', 'in', 'is', 'it', 'near',
+    'of', 'on', 'or', 'the', 'to', 'with', 'severity', 'issue', 'issues', 'report', 'reports',
+})
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens for BM25, without stopwords."""
+    return [token for token in re.findall(r'\w+', text.lower()) if token not in _STOPWORDS]
+
+
+def build_bm25(report_texts: Dict[str, str]) -> None:
+    """Rebuild the BM25 index from report ID -> lexical text (see build_lexical_text)."""
+    global _bm25, _bm25_ids
+    _bm25_ids = list(report_texts)
+    _bm25 = BM25Okapi([tokenize(report_texts[rid]) for rid in _bm25_ids]) if _bm25_ids else None
+
+
+def search_bm25(
+    query: str,
+    filters: Optional[Dict[str, Any]] = None,
+    top_k: int = 20,
+) -> List[Tuple[str, float]]:
+    """
+    Lexical search over report texts.
+    Returns (report_id, score) tuples for reports sharing terms with the query,
+    sorted by BM25 score descending.
+    """
+    tokens = tokenize(query)
+    if _bm25 is None or not tokens:
+        return []
+    
+    scores = _bm25.get_scores(tokens)
+    results = []
+    for idx in np.argsort(-scores):
+        if scores[idx] <= 0:
+            break
+        report_id = _bm25_ids[idx]
+        if filters and not matches_filters(_reports.get(report_id, {}), filters):
+            continue
+        results.append((report_id, float(scores[idx])))
+        if len(results) == top_k:
+            break
+    
+    return results
+
+
+def reciprocal_rank_fusion(rankings: List[List[Tuple[str, float]]]) -> List[Tuple[str, float]]:
+    """
+    Merge ranked result lists with Reciprocal Rank Fusion.
+    Only ranks matter, so cosine and BM25 scores don't need to be comparable.
+    """
+    fused: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, (report_id, _) in enumerate(ranking, start=1):
+            fused[report_id] = fused.get(report_id, 0.0) + 1.0 / (RRF_K + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+def matches_filters(report: Dict[str, Any], filters: Dict[str, Any]) -> bool:
+    """Check a report against severity/category/status filters from a search plan."""
+    content = report.get('content', {})
+    
+    severity = filters.get('severity')
+    if severity and content.get('severity') != severity.lower().strip():
+        return False
+    
+    category = filters.get('category')
+    if category and content.get('category') != category.lower().replace(' ', '_').replace('-', '_'):
+        return False
+    
+    status = filters.get('status')
+    if status and report.get('status') != status.lower().replace(' ', '_').replace('-', '_'):
+        return False
+    
+    return True
+
+
+def is_index_ready() -> bool:
+    """
+    Whether build_index has completed in this process (a disk-loaded index lacks
+    report data, and a build whose embedding call failed publishes none).
+    """
+    return _index is not None and bool(_reports)
+
+
+def get_search_preview(report_id: str) -> Optional[str]:
+    """Start of an indexed report's search text (None if it hasn't been indexed)."""
+    return _search_previews.get(report_id)
+
+
+def invalidate_index() -> None:
+    """Signal that reports changed and the index should be refreshed."""
+    global _data_version
+    _data_version += 1
+
+
+def get_data_version() -> int:
+    """Current report data version (see invalidate_index)."""
+    return _data_version
 
 
 async def search_similar(
@@ -129,30 +608,115 @@ async def search_similar(
     Returns:
         List of (report_id, score) tuples, sorted by score descending
     """
-    global _index, _id_map
+    if not USE_ATLAS_VECTOR and (_index is None or _index.ntotal == 0):
+        return []
     
+    return await search_vectors(await embed_query(query), top_k=top_k, threshold=threshold)
+
+
+async def search_vectors(
+    query_embedding: np.ndarray,
+    filters: Optional[Dict[str, Any]] = None,
+    top_k: int = 20,
+    threshold: float = 0.3,
+) -> List[Tuple[str, float]]:
+    """
+    Filtered vector search through Atlas when USE_ATLAS_VECTOR is set,
+    otherwise through the local index (see search_and_filter).
+    """
+    if USE_ATLAS_VECTOR:
+        return await search_atlas(query_embedding, filters, top_k=top_k, threshold=threshold)
+    return search_and_filter(query_embedding, filters, top_k=top_k, threshold=threshold)
+
+
+def atlas_filter(filters: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Translate severity/category/status filters (see matches_filters) into a $vectorSearch pre-filter."""
+    atlas = {}
+    if filters and filters.get('severity'):
+        atlas['content.severity'] = filters['severity'].lower().strip()
+    if filters and filters.get('category'):
+        atlas['content.category'] = filters['category'].lower().replace(' ', '_').replace('-', '_')
+    if filters and filters.get('status'):
+        atlas['status'] = filters['status'].lower().replace(' ', '_').replace('-', '_')
+    return atlas
+
+
+async def search_atlas(
+    query_embedding: np.ndarray,
+    filters: Optional[Dict[str, Any]] = None,
+    top_k: int = 20,
+    threshold: float = 0.3,
+) -> List[Tuple[str, float]]:
+    """Vector search through Atlas $vectorSearch, with scores on the same scale as FAISS."""
+    query_vector = normalize_vectors(query_embedding.reshape(1, -1))[0].tolist()
+    results = await vector_search_reports(query_vector, top_k, filter=atlas_filter(filters))
+    
+    # Atlas reports cosine similarity as (1 + cos) / 2; map back to cos
+    results = [(report_id, 2 * score - 1) for report_id, score in results]
+    return [(report_id, score) for report_id, score in results if score >= threshold]
+
+
+def search_and_filter(
+    query_embedding: np.ndarray,
+    filters: Optional[Dict[str, Any]] = None,
+    top_k: int = 20,
+    threshold: float = 0.3,
+) -> List[Tuple[str, float]]:
+    """
+    Vector search and filtering in a single pass.
+    
+    Walks the nearest neighbours once, checking each candidate against the
+    filters (see matches_filters) using the indexed report documents, until
+    top_k matches are found. With filters, more neighbours are fetched so
+    that filtering doesn't starve the result list.
+    
+    Args:
+        query_embedding: Query embedding (from embed_query)
+        filters: Optional severity/category filters from a search plan
+        top_k: Maximum number of results to return
+        threshold: Minimum similarity score (0-1)
+    
+    Returns:
+        List of (report_id, score) tuples, sorted by score descending
+    """
     if _index is None or _index.ntotal == 0:
         return []
     
-    # Generate query embedding
-    model = get_embeddings_model()
-    query_embedding = await model.aembed_query(query)
-    query_vector = normalize_vectors(np.array([query_embedding], dtype=np.float32))
+    query_vector = normalize_vectors(query_embedding.reshape(1, -1))
     
-    # Search
-    k = min(top_k, _index.ntotal)
-    scores, indices = _index.search(query_vector, k)
+    # Over-fetch to make up for stale positions and filtered-out candidates
+    k = top_k * FILTER_OVERFETCH if filters else top_k
+    k = min(k + _stale_count, _index.ntotal)
+    if _all_vectors is not None:
+        # Small corpus: one BLAS matrix-vector product beats the graph walk
+        all_scores = _all_vectors @ query_vector[0]
+        top = np.argpartition(-all_scores, k - 1)[:k]
+        top = top[np.argsort(-all_scores[top])]
+        scores, indices = all_scores[top][None], top[None]
+    else:
+        _index.hnsw.efSearch = max(HNSW_EF_SEARCH, k)
+        scores, indices = _index.search(query_vector, k)
     
     # Filter by threshold and map to report IDs
     results = []
     for score, idx in zip(scores[0], indices[0]):
-        if idx >= 0 and score >= threshold:
-            results.append((_id_map[idx], float(score)))
+        if score < threshold:
+            break
+        report_id = _id_map[idx] if idx >= 0 else None
+        if report_id is None:
+            continue
+        if filters and not matches_filters(_reports.get(report_id, {}), filters):
+            continue
+        results.append((report_id, float(score)))
+        if len(results) == top_k:
+            break
     
     return results
 
 
 def get_index_size() -> int:
-    """Get the number of vectors in the index."""
-    global _index
-    return _index.ntotal if _index is not None else 0
+    """Get the number of reports in the index."""
+    return len(_positions)
+
+
+_load_from_disk()
@@ -7,31 +7,77 @@ Provides REST API endpoints for:
 - Solution Agent: Generate fix recommendations
 """
 
+import io
 import os
+import logging
+import hashlib
+import orjson
+import base64
+import binascii
+import asyncio
 from contextlib import asynccontextmanager
-from typing import Optional
+from typing import Any, Dict, Optional, Tuple
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, ConfigDict
 from dotenv import load_dotenv
 
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional (PNG -> JPEG re-encoding)
+    Image = None
+
 # Load environment variables
 load_dotenv()
 
-from agent import run_vision_agent, run_search_agent, run_solution_agent, run_search
-from db import get_all_reports
-from embeddings import build_index, get_index_size
+from logging_config import setup_logging, shutdown_logging
+
+setup_logging()
+
+from agent import (
+    run_vision_agent,
+    run_search_agent,
+    run_search_agent_stream,
+    run_solution_agent,
+    run_search,
+)
+from db import get_all_reports, invalidate_reports_cache, reports_fingerprint, watch_reports
+from cache import LRUCache, SemanticCache, close_redis_cache, normalize_query
+from agents.fast_intent import classify_intent
+from embeddings import (
+    build_index,
+    build_report_text,
+    embed_query,
+    get_data_version,
+    get_index_size,
+    get_search_preview,
+    SEARCH_PREVIEW_CHARS,
+    invalidate_index,
+    close_embedding_cache,
+)
+
+logger = logging.getLogger(__name__)
 
 
 # === Request/Response Models ===
 
+# Request bodies are never mutated; whitespace is stripped during validation.
+# Responses are built from agent results that carry extra keys (scores, agent),
+# so they ignore extras rather than forbidding them.
+REQUEST_CONFIG = ConfigDict(frozen=True, extra='forbid', str_strip_whitespace=True)
+RESPONSE_CONFIG = ConfigDict(frozen=True)
+
+
 class SearchRequest(BaseModel):
     """Request body for search endpoint."""
+    model_config = REQUEST_CONFIG
     query: str
 
 
 class SearchResponse(BaseModel):
     """Response body for search endpoint."""
+    model_config = RESPONSE_CONFIG
     matchingIds: list[str]
     summary: str
     reasoning: str
@@ -41,6 +87,7 @@ class SearchResponse(BaseModel):
 
 class VisionRequest(BaseModel):
     """Request body for vision agent endpoint."""
+    model_config = REQUEST_CONFIG
     imageBase64: str
     mimeType: str = "image/jpeg"
     filename: str = "image.jpg"
@@ -48,6 +95,7 @@ class VisionRequest(BaseModel):
 
 class VisionResponse(BaseModel):
     """Response body for vision agent endpoint."""
+    model_config = RESPONSE_CONFIG
     category: str
     severity: str
     title: str
@@ -59,6 +107,7 @@ class VisionResponse(BaseModel):
 
 class SolutionRequest(BaseModel):
     """Request body for solution agent endpoint."""
+    model_config = REQUEST_CONFIG
     description: str
     category: str
     severity: str
@@ -68,6 +117,7 @@ class SolutionRequest(BaseModel):
 
 class SolutionResponse(BaseModel):
     """Response body for solution agent endpoint."""
+    model_config = RESPONSE_CONFIG
     suggestedFix: str
     estimatedCost: str
     estimatedTime: str
@@ -78,23 +128,168 @@ class SolutionResponse(BaseModel):
     agent: str
 
 
+class AnalyzeRequest(BaseModel):
+    """Request body for the combined vision + solution endpoint."""
+    model_config = REQUEST_CONFIG
+    imageBase64: str
+    mimeType: str = "image/jpeg"
+    filename: str = "image.jpg"
+    # When all three are known up front, the solution doesn't wait for vision
+    description: Optional[str] = None
+    category: Optional[str] = None
+    severity: Optional[str] = None
+
+
+class AnalyzeResponse(BaseModel):
+    """Response body for the combined vision + solution endpoint."""
+    model_config = RESPONSE_CONFIG
+    vision: VisionResponse
+    solution: SolutionResponse
+
+
+# === Search Result Cache ===
+
+# Identical repeat searches (retries, pagination) are answered before embedding;
+# paraphrases (cosine >= 0.95) reuse the earlier response. Both keep entries for
+# 5 minutes and are cleared whenever report data changes.
+_exact_search_cache = LRUCache(maxsize=512, ttl=300)
+_search_cache = SemanticCache(threshold=0.95, ttl=300, maxsize=1000)
+_search_cache_version = 0
+
+
+def clear_search_caches() -> None:
+    _exact_search_cache.clear()
+    _search_cache.clear()
+
+
+def get_search_cache() -> SemanticCache:
+    """Get the search result cache, emptied if reports changed since it was filled."""
+    global _search_cache_version
+    if get_data_version() != _search_cache_version:
+        clear_search_caches()
+        _search_cache_version = get_data_version()
+    return _search_cache
+
+
+def search_filters_key(query: str) -> Optional[str]:
+    """
+    Exact-match key for the semantic cache: the query's keyword filters, so
+    "high severity potholes" can't reuse the result for "low severity potholes".
+    None when the filters need the LLM, in which case the semantic cache is skipped.
+    """
+    plan = classify_intent(query)
+    if plan is None:
+        return None
+    return orjson.dumps(plan.get("filters") or {}, option=orjson.OPT_SORT_KEYS).decode()
+
+
+# === Image Decoding ===
+
+# PNG uploads above this size are re-encoded as JPEG before going to Gemini
+PNG_REENCODE_MIN_BYTES = 500 * 1024
+
+
+def decode_image(image_base64: str, mime_type: str) -> Tuple[bytes, str]:
+    """
+    Decode an uploaded image (blocking - run it in a thread).
+    Large PNGs are re-encoded as JPEG (quality 85) when Pillow is installed.
+    Returns the image bytes and their MIME type.
+    """
+    raw = base64.b64decode(image_base64)
+    if Image is None or mime_type != "image/png" or len(raw) <= PNG_REENCODE_MIN_BYTES:
+        return raw, mime_type
+    
+    try:
+        with Image.open(io.BytesIO(raw)) as image:
+            out = io.BytesIO()
+            image.convert("RGB").save(out, format="JPEG", quality=85)
+    except OSError:
+        # Not a readable PNG after all; let Gemini handle the original
+        return raw, mime_type
+    return out.getvalue(), "image/jpeg"
+
+
+async def read_image(image_base64: str, mime_type: str) -> Tuple[bytes, str]:
+    """Decode an uploaded image off the event loop (400 if it isn't base64)."""
+    try:
+        return await asyncio.to_thread(decode_image, image_base64, mime_type)
+    except binascii.Error:
+        raise HTTPException(status_code=400, detail="Image data is not valid base64")
+
+
+# Vision results by image content hash, so re-uploads of the same photo skip Gemini
+_vision_cache = LRUCache(maxsize=256, ttl=24 * 3600)
+
+
 # === App Setup ===
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    """Startup and shutdown events."""
-    print("[INFO] Starting Communify Agent Backend...")
-    print("[INFO] Agents: Vision, Search, Solution")
+async def build_initial_index() -> None:
+    """Fetch reports and build the search index (runs in the background at startup)."""
     try:
-        reports = get_all_reports()
+        reports = await get_all_reports()
         count = await build_index(reports)
-        print(f"[OK] Indexed {count} reports for semantic search")
+        logger.info("Indexed %d reports for semantic search", count)
     except Exception as e:
-        print(f"[WARN] Index build failed (will retry on first search): {e}")
+        logger.warning("Index build failed (will retry on first search): %s", e)
+
+
+# How often the background task checks MongoDB for report changes (0 disables it)
+INDEX_REFRESH_SECONDS = float(os.getenv('INDEX_REFRESH_SECONDS', '60'))
+
+
+async def refresh_index_periodically() -> None:
+    """
+    Rebuild the index when reports change, so tools and searches can use it
+    without checking the database on every call. Runs until cancelled.
+    """
+    last_fingerprint, last_version = None, get_data_version()
+    while True:
+        await asyncio.sleep(INDEX_REFRESH_SECONDS)
+        try:
+            reports = await get_all_reports()
+            fingerprint, version = reports_fingerprint(reports), get_data_version()
+            if fingerprint != last_fingerprint or version != last_version:
+                await build_index(reports)
+                last_fingerprint, last_version = fingerprint, version
+        except Exception as e:
+            logger.warning("Background index refresh failed: %s", e)
+
+
+async def wait_for_index() -> None:
+    """Let a search wait for the startup index build, if it is still running."""
+    task = app.state.index_task
+    if not task.done():
+        # Shielded so a disconnecting client doesn't cancel the build for everyone
+        await asyncio.shield(task)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Startup and shutdown events."""
+    logger.info("Starting Communify Agent Backend (agents: Vision, Search, Solution)")
+    
+    # Serve requests right away; searches wait for the index if they arrive first
+    app.state.index_task = asyncio.create_task(build_initial_index())
+    refresher = None
+    if INDEX_REFRESH_SECONDS > 0:
+        refresher = asyncio.create_task(refresh_index_periodically())
+    
+    # Refresh caches and the index when reports change in MongoDB
+    watcher = None
+    if os.getenv('WATCH_REPORTS', '1') == '1':
+        watcher = asyncio.create_task(watch_reports(on_change=invalidate_index))
     
     yield
     
-    print("[INFO] Shutting down agent backend...")
+    logger.info("Shutting down agent backend")
+    app.state.index_task.cancel()
+    if refresher is not None:
+        refresher.cancel()
+    if watcher is not None:
+        watcher.cancel()
+    await close_redis_cache()
+    close_embedding_cache()
+    shutdown_logging()
 
 
 app = FastAPI(
@@ -127,12 +322,29 @@ async def health_check():
     return {
         "status": "healthy",
         "agents": ["vision", "search", "solution"],
+        "index_ready": app.state.index_task.done(),
         "index_size": get_index_size(),
+        "search_cache_hit_rate": round(_search_cache.hit_rate, 3),
     }
 
 
 # === Vision Agent Endpoint ===
 
+async def analyze_image(image_bytes: bytes, mime_type: str, filename: str) -> Dict[str, Any]:
+    """Run the vision agent, reusing the cached result for an identical image."""
+    key = hashlib.sha256(image_bytes).hexdigest()
+    result = _vision_cache.get(key)
+    if result is None:
+        result = await run_vision_agent(
+            image_bytes=image_bytes,
+            mime_type=mime_type,
+            filename=filename
+        )
+        if "error" not in result:
+            _vision_cache.set(key, result)
+    return result
+
+
 @app.post("/agent/vision", response_model=VisionResponse)
 async def vision_analyze(request: VisionRequest):
     """
@@ -146,15 +358,13 @@ async def vision_analyze(request: VisionRequest):
     if not request.imageBase64:
         raise HTTPException(status_code=400, detail="Image data is required")
     
+    # Decode once at the boundary; the agent sends raw bytes to Gemini
+    image_bytes, mime_type = await read_image(request.imageBase64, request.mimeType)
+    
     try:
-        result = await run_vision_agent(
-            image_base64=request.imageBase64,
-            mime_type=request.mimeType,
-            filename=request.filename
-        )
-        return VisionResponse(**result)
+        return VisionResponse(**await analyze_image(image_bytes, mime_type, request.filename))
     except Exception as e:
-        print(f"Vision agent error: {e}")
+        logger.exception("Vision agent error")
         raise HTTPException(status_code=500, detail=f"Vision analysis failed: {str(e)}")
 
 
@@ -168,17 +378,72 @@ async def search(request: SearchRequest):
     The Search Agent uses semantic search combined with intelligent
     filtering to find the most relevant reports.
     """
-    if not request.query or not request.query.strip():
+    if not request.query:
         raise HTTPException(status_code=400, detail="Query is required")
     
+    await wait_for_index()
+    
     try:
-        result = await run_search(request.query.strip())
+        query = request.query
+        cache = get_search_cache()
+        key = normalize_query(query)
+        result = _exact_search_cache.get(key)
+        if result is None:
+            filters_key = search_filters_key(query)
+            if filters_key is None:
+                result = await run_search(query)
+            else:
+                query_embedding = await embed_query(query)
+                result = cache.get(query_embedding, filters_key)
+                if result is None:
+                    result = await run_search(query)
+                    cache.set(query_embedding, result, filters_key)
+            _exact_search_cache.set(key, result)
         return SearchResponse(**result)
     except Exception as e:
-        print(f"Search error: {e}")
+        logger.exception("Search error")
         raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
 
 
+@app.post("/agent/search/stream")
+async def search_stream(request: SearchRequest):
+    """
+    Search for accessibility reports, streamed as Server-Sent Events.
+    
+    The first event carries the vector search candidates ("partial": true) so
+    the client can render them immediately; the last event is the full
+    filtered result ("partial": false).
+    """
+    if not request.query:
+        raise HTTPException(status_code=400, detail="Query is required")
+    
+    await wait_for_index()
+    
+    async def event_stream():
+        try:
+            async for event in run_search_agent_stream(request.query):
+                yield f"data: {orjson.dumps(event).decode()}\n\n"
+        except Exception as e:
+            logger.exception("Search stream error")
+            yield f"event: error\ndata: {orjson.dumps({'detail': f'Search failed: {str(e)}'}).decode()}\n\n"
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
+# === Index Endpoint ===
+
+@app.post("/agent/index/invalidate")
+async def invalidate_search_index():
+    """
+    Mark the search index as stale after reports are created, updated or deleted.
+    The next search re-fetches reports and only embeds what changed.
+    """
+    invalidate_reports_cache()
+    invalidate_index()
+    clear_search_caches()
+    return {"status": "ok"}
+
+
 # === Solution Agent Endpoint ===
 
 @app.post("/agent/solution", response_model=SolutionResponse)
@@ -195,20 +460,69 @@ async def solution_generate(request: SolutionRequest):
     if not request.description:
         raise HTTPException(status_code=400, detail="Description is required")
     
+    image_bytes, mime_type = None, request.mimeType
+    if request.imageBase64:
+        image_bytes, mime_type = await read_image(request.imageBase64, request.mimeType)
+    
     try:
         result = await run_solution_agent(
             description=request.description,
             category=request.category,
             severity=request.severity,
-            image_base64=request.imageBase64,
-            mime_type=request.mimeType
+            image_bytes=image_bytes,
+            mime_type=mime_type
         )
         return SolutionResponse(**result)
     except Exception as e:
-        print(f"Solution agent error: {e}")
+        logger.exception("Solution agent error")
         raise HTTPException(status_code=500, detail=f"Solution generation failed: {str(e)}")
 
 
+# === Combined Analysis Endpoint ===
+
+@app.post("/agent/analyze", response_model=AnalyzeResponse)
+async def analyze(request: AnalyzeRequest):
+    """
+    Analyze an image and generate fix recommendations in one request.
+    
+    Saves the client a second round-trip to /agent/solution. If the request
+    already has a description, category and severity, the solution is
+    generated concurrently with the vision analysis; otherwise it uses the
+    vision agent's findings.
+    """
+    if not request.imageBase64:
+        raise HTTPException(status_code=400, detail="Image data is required")
+    
+    image_bytes, mime_type = await read_image(request.imageBase64, request.mimeType)
+    
+    def solve(description: str, category: str, severity: str):
+        return run_solution_agent(
+            description=description,
+            category=category,
+            severity=severity,
+            image_bytes=image_bytes,
+            mime_type=mime_type
+        )
+    
+    try:
+        if request.description and request.category and request.severity:
+            vision, solution = await asyncio.gather(
+                analyze_image(image_bytes, mime_type, request.filename),
+                solve(request.description, request.category, request.severity),
+            )
+        else:
+            vision = await analyze_image(image_bytes, mime_type, request.filename)
+            solution = await solve(
+                request.description or vision["description"],
+                request.category or vision["category"],
+                request.severity or vision["severity"],
+            )
+        return AnalyzeResponse(vision=VisionResponse(**vision), solution=SolutionResponse(**solution))
+    except Exception as e:
+        logger.exception("Analyze error")
+        raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+
+
 # === Stats Endpoint ===
 
 @app.get("/agent/stats")
@@ -216,7 +530,7 @@ async def get_stats():
     """Get statistics about the search index and reports."""
     from tools import get_report_stats
     
-    stats = get_report_stats.invoke({})
+    stats = await get_report_stats.ainvoke({})
     return {
         "index_size": get_index_size(),
         "report_stats": stats,
@@ -230,26 +544,41 @@ async def get_stats():
 
 # === Debug Endpoint ===
 
+def _debug_row(report: Dict[str, Any]) -> Dict[str, Any]:
+    """Summary of one report for the debug endpoint."""
+    content = report.get('content', {})
+    return {
+        "id": report['_id'],
+        "title": content.get('title', 'Untitled'),
+        "category": content.get('category', 'unknown'),
+        "severity": content.get('severity', 'unknown'),
+        "description": content.get('description', '')[:150],
+        "search_text": get_search_preview(report['_id']) or build_report_text(report)[:SEARCH_PREVIEW_CHARS],
+    }
+
+
 @app.get("/agent/debug/reports")
 async def debug_reports():
     """Debug endpoint: view all reports and their search text."""
-    from embeddings import build_report_text
-    
-    reports = get_all_reports()
-    debug_data = []
-    for report in reports:
-        content = report.get('content', {})
-        debug_data.append({
-            "id": report['_id'],
-            "title": content.get('title', 'Untitled'),
-            "category": content.get('category', 'unknown'),
-            "severity": content.get('severity', 'unknown'),
-            "description": content.get('description', '')[:150],
-            "search_text": build_report_text(report)[:200],
-        })
-    return {"total": len(debug_data), "reports": debug_data}
+    reports = await get_all_reports()
+    debug_data = [_debug_row(report) for report in reports]
+    # Encoded directly so FastAPI skips its jsonable_encoder pass over the list
+    return Response(orjson.dumps({"total": len(debug_data), "reports": debug_data}), media_type="application/json")
 
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
+    # Worker processes would share the shelve embedding cache (not multi-writer
+    # safe) and the saved index files, so only a single process is supported
+    if int(os.getenv('WORKERS', '1')) > 1:
+        raise SystemExit("WORKERS > 1 is not supported: workers would share the on-disk embedding cache and index files")
+    # "auto" picks uvloop/httptools (installed by uvicorn[standard]) when available;
+    # the file watcher only runs with DEV=1
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8000,
+        reload=os.getenv('DEV') == '1',
+        loop="auto",
+        http="auto",
+    )
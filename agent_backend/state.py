@@ -9,9 +9,9 @@ class AgentState(TypedDict):
     # Chat history
     messages: Annotated[Sequence[BaseMessage], operator.add]
     
-    # Structured intent extracted by the Analyst
+    # Structured intent extracted by the Analyst (parsed once, read by later nodes)
     # This acts as the "handover" document from Analyst to Specialist
-    search_plan: Optional[str] 
+    search_plan_dict: Optional[Dict[str, Any]]
     
     # Results found by the Specialist
     matching_ids: List[str]
@@ -0,0 +1,33 @@
+"""
+Tests for matching batched Gemini answers back to their requests (agents/batcher.py).
+"""
+
+from agents.batcher import match_batch_answers
+
+
+def test_match_batch_answers_orders_by_request_number():
+    elements = [
+        {"request": 2, "answer": {"title": "second"}},
+        {"request": 1, "answer": {"title": "first"}},
+    ]
+
+    assert match_batch_answers(elements, 2) == [{"title": "first"}, {"title": "second"}]
+
+
+def test_match_batch_answers_rejects_duplicate_request_numbers():
+    elements = [
+        {"request": 1, "answer": {}},
+        {"request": 1, "answer": {}},
+    ]
+
+    assert match_batch_answers(elements, 2) is None
+
+
+def test_match_batch_answers_rejects_missing_or_out_of_range_numbers():
+    assert match_batch_answers([{"request": 1, "answer": {}}, {"answer": {}}], 2) is None
+    assert match_batch_answers([{"request": 1, "answer": {}}, {"request": 3, "answer": {}}], 2) is None
+
+
+def test_match_batch_answers_rejects_untagged_arrays():
+    assert match_batch_answers([{"title": "first"}, {"title": "second"}], 2) is None
+    assert match_batch_answers({"request": 1, "answer": {}}, 1) is None
@@ -0,0 +1,54 @@
+"""
+Tests for the keyword intent classifier in agents/fast_intent.py.
+"""
+
+import pytest
+
+from agents.fast_intent import classify_intent
+
+
+@pytest.mark.parametrize("query, category", [
+    ("broken sidewalk near campus", "broken_sidewalk"),
+    ("missing ramp at the library entrance", "missing_ramp"),
+    ("no curb cut on College Street", "no_curb_cut"),
+    ("blocked path outside the station", "blocked_path"),
+    ("potholes on the bike lane", "pothole"),
+    ("building entrance without a ramp", "no_ramp"),
+])
+def test_classify_intent_maps_phrases_to_categories(query, category):
+    plan = classify_intent(query)
+
+    assert plan["filters"] == {"category": category}
+    assert plan["semantic_query"] == query
+
+
+@pytest.mark.parametrize("query", [
+    "hedgehog crossing sign near the park",
+    "dark underpass by the station",
+    "steep ramp near campus",
+])
+def test_classify_intent_ignores_incidental_words(query):
+    plan = classify_intent(query)
+
+    assert plan["filters"] == {}
+
+
+def test_classify_intent_extracts_severity_and_status():
+    plan = classify_intent("high severity potholes that are unresolved")
+
+    assert plan["filters"] == {"severity": "high", "status": "open", "category": "pothole"}
+
+
+def test_classify_intent_does_not_treat_high_curb_as_severity():
+    plan = classify_intent("high curb at the crosswalk")
+
+    assert "severity" not in plan["filters"]
+
+
+@pytest.mark.parametrize("query", [
+    "potholes but not near campus",
+    "broken sidewalk or blocked path",
+    "ramps",
+])
+def test_classify_intent_defers_ambiguous_queries(query):
+    assert classify_intent(query) is None
@@ -0,0 +1,59 @@
+"""
+Tests for the agent tools in tools.py.
+"""
+
+import asyncio
+
+import pytest
+
+import tools
+
+CENTER_LAT, CENTER_LNG = 43.66, -79.39
+
+# Coordinates are stored GeoJSON-style as [lng, lat]
+REPORTS = [
+    {"_id": "far", "location": {"coordinates": [CENTER_LNG, 43.70]}},     # ~4.448 km north
+    {"_id": "near", "location": {"coordinates": [CENTER_LNG, 43.67]}},    # ~1.112 km north
+    {"_id": "here", "location": {"coordinates": [CENTER_LNG, CENTER_LAT]}},
+    {"_id": "no_location"},
+]
+
+
+@pytest.fixture(autouse=True)
+def fake_reports(monkeypatch):
+    async def get_all_reports():
+        return REPORTS
+
+    monkeypatch.setattr(tools, "get_all_reports", get_all_reports)
+    monkeypatch.setattr(tools, "get_reports_generation", lambda: -1)
+    monkeypatch.setattr(tools, "_coords_cache", None)
+
+
+def run_filter(radius_km):
+    return asyncio.run(tools.filter_by_location.ainvoke({
+        "lat": CENTER_LAT,
+        "lng": CENTER_LNG,
+        "radius_km": radius_km,
+    }))
+
+
+def test_filter_by_location_sorts_by_distance():
+    result = run_filter(5.0)
+
+    assert result["matching_ids"] == ["here", "near", "far"]
+    assert result["match_count"] == 3
+    assert result["center"] == {"lat": CENTER_LAT, "lng": CENTER_LNG}
+
+
+def test_filter_by_location_rounds_distances():
+    result = run_filter(5.0)
+
+    assert result["distances"] == {"here": 0.0, "near": 1.112, "far": 4.448}
+
+
+def test_filter_by_location_excludes_reports_outside_radius():
+    result = run_filter(2.0)
+
+    assert result["matching_ids"] == ["here", "near"]
+    assert result["match_count"] == 2
+    assert "far" not in result["distances"]
@@ -4,11 +4,47 @@ Each tool is a function that the agent can invoke to perform specific operations
 """
 
 import math
-from typing import List, Dict, Any, Optional
+import logging
+import numpy as np
+from collections import Counter
+from typing import Callable, List, Dict, Any, Optional, Tuple
 from langchain_core.tools import tool
 
-from db import get_all_reports, filter_reports as db_filter_reports
-from embeddings import search_similar, build_index, get_index_size
+from db import REPORTS_LIMIT, filter_reports, get_all_reports, get_reports_generation, reports_fingerprint
+from embeddings import (
+    search_similar,
+    build_index,
+    is_index_ready,
+    get_index_size,
+    get_by_category,
+    get_by_severity,
+    get_by_status,
+)
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371
+
+# Accepted filter values, and the error returned for anything else
+_VALID_CATEGORIES = frozenset({
+    'broken_sidewalk', 'missing_ramp', 'blocked_path', 'steep_grade',
+    'poor_lighting', 'narrow_passage', 'uneven_surface', 'other',
+})
+_VALID_SEVERITIES = frozenset({'low', 'medium', 'high'})
+_VALID_STATUSES = frozenset({'draft', 'open', 'acknowledged', 'in_progress', 'resolved'})
+
+_CATEGORY_ERR = f"Invalid category. Must be one of: {', '.join(sorted(_VALID_CATEGORIES))}"
+_SEVERITY_ERR = f"Invalid severity. Must be one of: {', '.join(sorted(_VALID_SEVERITIES))}"
+_STATUS_ERR = f"Invalid status. Must be one of: {', '.join(sorted(_VALID_STATUSES))}"
+
+
+async def ensure_index() -> None:
+    """
+    Build the index if it hasn't been built yet. Later report changes are picked
+    up by the background refresh in main.py, so the hot path skips the DB.
+    """
+    if not is_index_ready():
+        await build_index(await get_all_reports())
 
 
 @tool
@@ -24,30 +60,48 @@ async def vector_search(query: str, top_k: int = 20) -> Dict[str, Any]:
     Returns:
         Dictionary with matching report IDs and their similarity scores
     """
-    # Ensure index is built
-    reports = get_all_reports()
-    await build_index(reports)
+    await ensure_index()
     
     # Search
     results = await search_similar(query, top_k=top_k)
     
+    # Collect IDs and rounded scores in one pass
+    matching_ids = [None] * len(results)
+    scores = {}
+    for i, (report_id, score) in enumerate(results):
+        matching_ids[i] = report_id
+        scores[report_id] = round(score, 3)
+    
     # Log similarity scores for debugging
-    if results:
-        print(f"[VECTOR_SEARCH] Top results for '{query}':")
-        for report_id, score in results[:5]:
-            print(f"  - {report_id}: {score:.3f}")
+    if results and logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "Top results for %r: %s",
+            query,
+            ", ".join(f"{report_id}={scores[report_id]:.3f}" for report_id in matching_ids[:5]),
+        )
     
     return {
-        "matching_ids": [r[0] for r in results],
-        "scores": {r[0]: round(r[1], 3) for r in results},
+        "matching_ids": matching_ids,
+        "scores": scores,
         "total_indexed": get_index_size(),
-        "match_count": len(results),
+        "match_count": len(matching_ids),
     }
 
 
+async def filter_ids(lookup: Callable[[str], List[str]], value: str, **query: str) -> List[str]:
+    """
+    IDs of reports matching one filter. Served from the index's filter maps when
+    the index holds every report; once there are more reports than get_all_reports
+    loads, MongoDB is queried so older reports aren't silently dropped.
+    """
+    await ensure_index()
+    if get_index_size() < REPORTS_LIMIT:
+        return list(lookup(value))
+    return [report['_id'] for report in await filter_reports(**query)]
+
 
 @tool
-def filter_by_category(category: str) -> Dict[str, Any]:
+async def filter_by_category(category: str) -> Dict[str, Any]:
     """
     Filter reports by accessibility barrier category.
     Use this when the user specifies a type of barrier.
@@ -59,29 +113,24 @@ def filter_by_category(category: str) -> Dict[str, Any]:
     Returns:
         Dictionary with matching report IDs
     """
-    valid_categories = [
-        'broken_sidewalk', 'missing_ramp', 'blocked_path', 'steep_grade',
-        'poor_lighting', 'narrow_passage', 'uneven_surface', 'other'
-    ]
-    
     # Normalize input
     normalized = category.lower().replace(' ', '_').replace('-', '_')
-    if normalized not in valid_categories:
+    if normalized not in _VALID_CATEGORIES:
         return {
-            "error": f"Invalid category. Must be one of: {', '.join(valid_categories)}",
+            "error": _CATEGORY_ERR,
             "matching_ids": [],
         }
     
-    reports = db_filter_reports(category=normalized)
+    matching_ids = await filter_ids(get_by_category, normalized, category=normalized)
     return {
-        "matching_ids": [r['_id'] for r in reports],
-        "match_count": len(reports),
+        "matching_ids": matching_ids,
+        "match_count": len(matching_ids),
         "category": normalized,
     }
 
 
 @tool
-def filter_by_severity(severity: str) -> Dict[str, Any]:
+async def filter_by_severity(severity: str) -> Dict[str, Any]:
     """
     Filter reports by severity level.
     Use this when the user wants to see issues of a specific severity.
@@ -92,25 +141,24 @@ def filter_by_severity(severity: str) -> Dict[str, Any]:
     Returns:
         Dictionary with matching report IDs
     """
-    valid_severities = ['low', 'medium', 'high']
     normalized = severity.lower().strip()
     
-    if normalized not in valid_severities:
+    if normalized not in _VALID_SEVERITIES:
         return {
-            "error": f"Invalid severity. Must be one of: {', '.join(valid_severities)}",
+            "error": _SEVERITY_ERR,
             "matching_ids": [],
         }
     
-    reports = db_filter_reports(severity=normalized)
+    matching_ids = await filter_ids(get_by_severity, normalized, severity=normalized)
     return {
-        "matching_ids": [r['_id'] for r in reports],
-        "match_count": len(reports),
+        "matching_ids": matching_ids,
+        "match_count": len(matching_ids),
         "severity": normalized,
     }
 
 
 @tool
-def filter_by_status(status: str) -> Dict[str, Any]:
+async def filter_by_status(status: str) -> Dict[str, Any]:
     """
     Filter reports by resolution status.
     Use this when the user wants to see issues with a specific status.
@@ -121,25 +169,60 @@ def filter_by_status(status: str) -> Dict[str, Any]:
     Returns:
         Dictionary with matching report IDs
     """
-    valid_statuses = ['draft', 'open', 'acknowledged', 'in_progress', 'resolved']
     normalized = status.lower().strip().replace(' ', '_').replace('-', '_')
     
-    if normalized not in valid_statuses:
+    if normalized not in _VALID_STATUSES:
         return {
-            "error": f"Invalid status. Must be one of: {', '.join(valid_statuses)}",
+            "error": _STATUS_ERR,
             "matching_ids": [],
         }
     
-    reports = db_filter_reports(status=normalized)
+    matching_ids = await filter_ids(get_by_status, normalized, status=normalized)
     return {
-        "matching_ids": [r['_id'] for r in reports],
-        "match_count": len(reports),
+        "matching_ids": matching_ids,
+        "match_count": len(matching_ids),
         "status": normalized,
     }
 
 
+def haversine_distances(coords: np.ndarray, lat: float, lng: float) -> np.ndarray:
+    """Great-circle distances (km) from (lat, lng) to each (lng, lat) row of coords."""
+    phi1 = math.radians(lat)
+    phi2 = np.radians(coords[:, 1])
+    dphi = phi2 - phi1
+    dlambda = np.radians(coords[:, 0] - lng)
+    
+    a = np.sin(dphi / 2) ** 2 + math.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+# Report coordinates as arrays, rebuilt when get_all_reports refetches
+_coords_cache: Optional[Tuple[int, List[str], np.ndarray]] = None
+
+
+def get_report_coordinates(reports: List[Dict[str, Any]]) -> Tuple[List[str], np.ndarray]:
+    """
+    IDs and (lng, lat) coordinates of the reports that have a location.
+    Cached for the report list most recently returned by get_all_reports.
+    """
+    global _coords_cache
+    
+    generation = get_reports_generation()
+    if _coords_cache is None or _coords_cache[0] != generation:
+        ids, coords = [], []
+        for report in reports:
+            location = report.get('location') or {}
+            point = location.get('coordinates') or []
+            if len(point) == 2:
+                ids.append(report['_id'])
+                coords.append(point)
+        _coords_cache = (generation, ids, np.array(coords, dtype=np.float64).reshape(-1, 2))
+    
+    return _coords_cache[1], _coords_cache[2]
+
+
 @tool
-def filter_by_location(lat: float, lng: float, radius_km: float = 1.0) -> Dict[str, Any]:
+async def filter_by_location(lat: float, lng: float, radius_km: float = 1.0) -> Dict[str, Any]:
     """
     Filter reports by geographic location.
     Use this when the user specifies a location or wants nearby reports.
@@ -152,45 +235,31 @@ def filter_by_location(lat: float, lng: float, radius_km: float = 1.0) -> Dict[s
     Returns:
         Dictionary with matching report IDs and their distances
     """
-    reports = get_all_reports()
-    
-    # Haversine formula for distance calculation
-    def haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-        R = 6371  # Earth's radius in kilometers
-        phi1, phi2 = math.radians(lat1), math.radians(lat2)
-        dphi = math.radians(lat2 - lat1)
-        dlambda = math.radians(lon2 - lon1)
-        
-        a = math.sin(dphi/2)**2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda/2)**2
-        return 2 * R * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    
-    results = []
-    for report in reports:
-        location = report.get('location', {})
-        coords = location.get('coordinates', [])
-        if len(coords) == 2:
-            report_lng, report_lat = coords
-            distance = haversine(lat, lng, report_lat, report_lng)
-            if distance <= radius_km:
-                results.append({
-                    "id": report['_id'],
-                    "distance_km": round(distance, 3),
-                })
+    ids, coords = get_report_coordinates(await get_all_reports())
+    
+    # Haversine formula for distance calculation, over all reports at once
+    distances = haversine_distances(coords, lat, lng)
     
     # Sort by distance
-    results.sort(key=lambda x: x['distance_km'])
+    nearby = np.flatnonzero(distances <= radius_km)
+    nearby = nearby[np.argsort(distances[nearby])]
+    matching_ids = [ids[i] for i in nearby]
     
     return {
-        "matching_ids": [r['id'] for r in results],
-        "distances": {r['id']: r['distance_km'] for r in results},
-        "match_count": len(results),
+        "matching_ids": matching_ids,
+        "distances": {ids[i]: round(float(distances[i]), 3) for i in nearby},
+        "match_count": len(matching_ids),
         "center": {"lat": lat, "lng": lng},
         "radius_km": radius_km,
     }
 
 
+# Last computed report stats, keyed by a fingerprint of the report list
+_stats_cache: Optional[Tuple[str, Dict[str, Any]]] = None
+
+
 @tool
-def get_report_stats() -> Dict[str, Any]:
+async def get_report_stats() -> Dict[str, Any]:
     """
     Get aggregate statistics about all reports.
     Use this when the user asks about overall trends or totals.
@@ -198,27 +267,29 @@ def get_report_stats() -> Dict[str, Any]:
     Returns:
         Dictionary with counts by category, severity, and status
     """
-    reports = get_all_reports()
+    global _stats_cache
     
+    reports = await get_all_reports()
+    
+    key = reports_fingerprint(reports)
+    if _stats_cache is not None and _stats_cache[0] == key:
+        return _stats_cache[1]
+    
+    # One pass to pull out the three columns, then C-level counting per column
+    categories, severities, statuses = [], [], []
+    for r in reports:
+        content = r.get('content', {})
+        categories.append(content.get('category', 'other'))
+        severities.append(content.get('severity', 'medium'))
+        statuses.append(r.get('status', 'open'))
     stats = {
         "total": len(reports),
-        "by_category": {},
-        "by_severity": {},
-        "by_status": {},
+        "by_category": dict(Counter(categories)),
+        "by_severity": dict(Counter(severities)),
+        "by_status": dict(Counter(statuses)),
     }
     
-    for report in reports:
-        content = report.get('content', {})
-        
-        category = content.get('category', 'other')
-        stats["by_category"][category] = stats["by_category"].get(category, 0) + 1
-        
-        severity = content.get('severity', 'medium')
-        stats["by_severity"][severity] = stats["by_severity"].get(severity, 0) + 1
-        
-        status = report.get('status', 'open')
-        stats["by_status"][status] = stats["by_status"].get(status, 0) + 1
-    
+    _stats_cache = (key, stats)
     return stats
 
 